@@ -6,33 +6,78 @@ We should use the llm to choose between 1 and 3 papers, it should be extremely c
 in choosing them, it's better to have less than more. 
 """
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from app.fetchers.pdf_handling import PdfReader
+from app.fetchers.pdf_cache import PdfCache
+from app.fetchers.text_cache import TextCache
 from app.database_management.vector_database.vector_database import FaissVectorDatabase
 from app.database_management.vectorizer.bert import BertVectorizer
-from app.composers.llms import LLMFactory, LLMProvider
+from app.composers.llms import LLMFactory, LLMProvider, PRIORITY_SELECTION
+from app.composers.prompt_packing import PromptPacker
+from app.composers.response_cache import LLMResponseCache
 import numpy as np
 import os
 
 class PaperAnalyzer:
-    def __init__(self, vector_db: FaissVectorDatabase, pdf_reader: PdfReader, llm_provider: LLMProvider, top_k: int = 40):
+    def __init__(self, vector_db: FaissVectorDatabase, pdf_reader: PdfReader, llm_provider: LLMProvider, top_k: int = 40,
+                 read_timeout: Optional[float] = None, selection_mode: str = 'pdf',
+                 prompt_token_budget: Optional[int] = None):
+        if selection_mode not in ('pdf', 'abstract'):
+            raise ValueError(f"Unknown selection mode '{selection_mode}', expected 'pdf' or 'abstract'")
         self.vector_db = vector_db
         self.pdf_reader = pdf_reader
         self.llm_provider = llm_provider
         self.top_k = top_k
+        # Papers whose PDF is not read in time are left out of the selection
+        self.read_timeout = read_timeout
+        # 'pdf' selects from the text of every hit's PDF, 'abstract' from the abstracts stored in the
+        # index, leaving the PDFs of the chosen papers to be read by the caller
+        self.selection_mode = selection_mode
+        # The selection prompt is packed within the smaller of this budget and the model's input limit,
+        # and left whole when neither is known
+        limits = [limit for limit in (prompt_token_budget, llm_provider.input_token_limit) if limit]
+        self.packer = PromptPacker(llm_provider.count_tokens, min(limits)) if limits else None
+        self.last_packing_report = None
 
-    def analyze_papers(self, vectorized_user_interests: np.ndarray, user_interests: str) -> List[Dict[str, Any]]:
-        # Get top 20 similar papers
-        similar_papers = self.vector_db.search(vectorized_user_interests, top_k=self.top_k)
+    def analyze_papers(self, vectorized_user_interests: np.ndarray, user_interests: str,
+                       filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        # Get top 20 similar papers, optionally restricted by sources/start_date/end_date
+        similar_papers = self.vector_db.search(vectorized_user_interests, top_k=self.top_k, **(filters or {}))
+        return self._analyze_similar_papers(similar_papers, user_interests)
+
+    def analyze_papers_batch(self, vectorized_user_interests: np.ndarray, user_interests: List[str],
+                             filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        # One index scan for every user, then the usual selection for each of them
+        similar_papers_per_user = self.vector_db.search_batch(vectorized_user_interests, top_k=self.top_k, **(filters or {}))
+        return [
+            self._analyze_similar_papers(similar_papers, interests)
+            for similar_papers, interests in zip(similar_papers_per_user, user_interests)
+        ]
+
+    def _analyze_similar_papers(self, similar_papers: List[Dict[str, Any]], user_interests: str) -> List[Dict[str, Any]]:
+        if self.selection_mode == 'abstract':
+            # Only papers indexed before abstracts were stored need their PDF
+            to_read = [paper for paper in similar_papers if not paper.get('abstract')]
+        else:
+            to_read = similar_papers
+
+        # Extract abstracts from PDFs, all of them at once
+        texts = {}
+        if to_read:
+            texts, failures = self.pdf_reader.read_many([paper['pdf_url'] for paper in to_read], self.read_timeout)
+            for url, error in failures.items():
+                print(f"Could not read {url}: {type(error).__name__}: {error}")
 
-        # Extract abstracts from PDFs
         abstracts = []
         for paper in similar_papers:
-            try:
-                abstract = self.pdf_reader.read(paper['pdf_url'])
-                abstracts.append({"pdf_url": paper['pdf_url'], "id": paper['id'], "abstract": abstract})
-            except Exception as e:
-                pass
+            if self.selection_mode == 'abstract' and paper.get('abstract'):
+                abstract = paper['abstract']
+            elif paper['pdf_url'] in texts:
+                abstract = texts[paper['pdf_url']]
+            else:
+                continue
+            abstracts.append({"pdf_url": paper['pdf_url'], "id": paper['id'], "abstract": abstract,
+                              "distance": paper.get('distance')})
 
         # Use LLM to choose 1-3 papers
         chosen_papers = self._choose_papers(abstracts, user_interests)
@@ -53,7 +98,7 @@ class PaperAnalyzer:
         ]
         return chosen_papers
     def _create_paper_selection_prompt(self, abstracts: List[Dict[str, str]], user_interests: str) -> str:
-        prompt = (
+        header = (
             f"You are a highly selective research assistant. Your task is to choose between 1 and 3 papers from the "
             f"following abstracts, based on their relevance to the user's interests and potential impact. "
             f"The user's interests are: '''{user_interests}'''\n\n"
@@ -61,13 +106,22 @@ class PaperAnalyzer:
             f"If no papers seem truly exceptional or closely related to the user's interests, select at least one."
             f"Here are the abstracts:\n\n ''' \n"
         )
-        for i, paper in enumerate(abstracts, 1):
-            prompt += f"Paper (ID: {paper['id']}):\n{paper['abstract']}\n\n"
-        prompt += (
+        footer = (
             "''' \nPlease provide your selection in the following format:\n"
             "Selected Paper IDs: [list of selected paper IDs, or 'None' if no papers are selected]\n"
             "Reasoning: [brief explanation for your choices, relating them to the user's interests]"
         )
+        if self.packer is None:
+            papers = ''.join(f"Paper (ID: {paper['id']}):\n{paper['abstract']}\n\n" for paper in abstracts)
+            return header + papers + footer
+
+        # Closer papers get a larger share of the budget
+        entries = [
+            (f"Paper (ID: {paper['id']}):\n", paper['abstract'], 1.0 / (1.0 + (paper.get('distance') or 0.0)))
+            for paper in abstracts
+        ]
+        prompt, self.last_packing_report = self.packer.pack(header, entries, footer)
+        print(f"Selection prompt: {self.last_packing_report}")
         return prompt
 
     def _parse_llm_response(self, llm_response: str) -> List[str]:
@@ -100,7 +154,8 @@ class PaperAnalyzerFactory:
         vector_db = self._create_vector_db(self.index_file, self.metadata_file)
         pdf_reader = self._create_pdf_reader()
         llm_provider = self._create_llm_provider()
-        return PaperAnalyzer(vector_db, pdf_reader, llm_provider, self.top_k)
+        return PaperAnalyzer(vector_db, pdf_reader, llm_provider, self.top_k, self.config.get('pdf_read_timeout'),
+                             self.config.get('selection_mode', 'pdf'), self.config.get('prompt_token_budget'))
     
     def _create_vector_db(self, index_file: str, metadata_file: str) -> FaissVectorDatabase:
         data_dir = self.config['data_dir']
@@ -109,16 +164,31 @@ class PaperAnalyzerFactory:
         vector_db = FaissVectorDatabase(
             dimension=self.config['vector_dimension'],
             index_file=index_file,
-            metadata_file=metadata_file)
-        vector_db.load()
+            metadata_file=metadata_file,
+            index_type=self.config.get('index_type', 'flat'),
+            index_params=self.config.get('index_params'),
+            search_params=self.config.get('search_params'),
+            mmap=self.config.get('mmap_index', True))
         return vector_db
     
     def _create_pdf_reader(self) -> PdfReader:
-        return PdfReader()
+        cache = None
+        if self.config.get('pdf_cache_dir'):
+            cache = PdfCache(os.path.join(self.data_dir, self.config['pdf_cache_dir']),
+                             max_bytes=self.config.get('pdf_cache_max_bytes', 2 << 30))
+        text_cache = None
+        if self.config.get('text_cache_file'):
+            text_cache = TextCache(os.path.join(self.data_dir, self.config['text_cache_file']))
+        return PdfReader(max_downloads=self.config.get('pdf_max_downloads', 8),
+                         max_processes=self.config.get('pdf_max_processes'),
+                         cache=cache, text_cache=text_cache)
     
     def _create_llm_provider(self) -> LLMProvider:
         api_key = self.config.get('api_key', os.getenv('API_KEY'))
-        return LLMFactory.create_provider(self.llm_provider, api_key, **self.llm_config)
+        llm_config = {"priority": PRIORITY_SELECTION, **self.llm_config}
+        if self.config.get('llm_cache_file'):
+            llm_config['response_cache'] = LLMResponseCache(os.path.join(self.data_dir, self.config['llm_cache_file']))
+        return LLMFactory.create_provider(self.llm_provider, api_key, **llm_config)
 
     def create_vectorizer(self) -> BertVectorizer:
         return BertVectorizer(model_name=self.config['bert_model_name'])
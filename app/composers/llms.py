@@ -1,12 +1,164 @@
 from abc import ABC, abstractmethod
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
 import google.generativeai as genai
 from google.generativeai import GenerationConfig
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from google.api_core.exceptions import ResourceExhausted
 from transformers import AutoModelForCausalLM, AutoTokenizer
+from app.composers.response_cache import LLMResponseCache
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
+# Lower goes first when calls queue on a rate limiter: papers must be selected before
+# they can be analyzed, and analyzed before the mail is written
+PRIORITY_SELECTION = 0
+PRIORITY_ANALYSIS = 1
+PRIORITY_MAIL = 2
+
+
+def estimate_tokens(text: str) -> int:
+    # About four characters per token for English text
+    return len(text) // 4 + 1
+
+
+class RateLimiter:
+    """
+    Requests per minute and tokens per minute budgets shared by every thread calling an API.
+
+    Each budget is a token bucket holding up to a minute's worth, refilled continuously.
+    Callers queue for the buckets in priority order (then arrival order), so a burst of
+    concurrent calls is spread out instead of all hitting the quota and backing off, and
+    urgent calls overtake the others. Wait times are recorded per priority.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the RateLimiter.
+
+        Args:
+            requests_per_minute (Optional[float]): The request budget. Defaults to unlimited.
+            tokens_per_minute (Optional[float]): The token budget. Defaults to unlimited.
+            clock (Callable[[], float]): The time source, in seconds. Defaults to time.monotonic.
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.clock = clock
+        self._requests = requests_per_minute
+        self._tokens = tokens_per_minute
+        self._refilled = clock()
+        self._condition = threading.Condition()
+        self._queue = []
+        self._arrivals = itertools.count()
+        self.waits: Dict[int, list] = {}
+
+    def acquire(self, tokens: int = 0, priority: int = PRIORITY_ANALYSIS) -> float:
+        """
+        Block until one request of the given number of tokens fits in the budgets, and take it.
+
+        Args:
+            tokens (int): The tokens the request will use. Defaults to 0.
+            priority (int): The caller's place in the queue, lower first. Defaults to PRIORITY_ANALYSIS.
+
+        Returns:
+            float: The seconds spent waiting.
+        """
+        # A request larger than a whole minute's budget only waits for a full bucket
+        if self.tokens_per_minute is not None:
+            tokens = min(tokens, self.tokens_per_minute)
+        started = self.clock()
+        with self._condition:
+            entry = (priority, next(self._arrivals))
+            heapq.heappush(self._queue, entry)
+            while True:
+                if self._queue[0] == entry:
+                    delay = self._delay(tokens)
+                    if delay <= 0:
+                        break
+                    self._condition.wait(delay)
+                else:
+                    self._condition.wait()
+            heapq.heappop(self._queue)
+            if self._requests is not None:
+                self._requests -= 1
+            if self._tokens is not None:
+                self._tokens -= tokens
+            waited = self.clock() - started
+            self.waits.setdefault(priority, []).append(waited)
+            # The next in line may fit already
+            self._condition.notify_all()
+        return waited
+
+    def metrics(self) -> Dict[int, Dict[str, float]]:
+        """
+        The number of requests and their mean and maximum wait in seconds, per priority.
+        """
+        with self._condition:
+            return {
+                priority: {"requests": len(waits), "mean_wait": sum(waits) / len(waits), "max_wait": max(waits)}
+                for priority, waits in sorted(self.waits.items())
+            }
+
+    def _delay(self, tokens: int) -> float:
+        # Refill the buckets, then how long until both hold enough
+        now = self.clock()
+        elapsed = now - self._refilled
+        self._refilled = now
+        delay = 0.0
+        if self._requests is not None:
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+            delay = max(delay, (1 - self._requests) * 60 / self.requests_per_minute)
+        if self._tokens is not None:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+            delay = max(delay, (tokens - self._tokens) * 60 / self.tokens_per_minute)
+        return delay
+
+
+_rate_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def shared_rate_limiter(provider: str, model: str, requests_per_minute: Optional[float] = None,
+                        tokens_per_minute: Optional[float] = None) -> RateLimiter:
+    """
+    The process-wide RateLimiter of a model's API quota, created with the given budgets on first use.
+
+    Args:
+        provider (str): The provider of the API, such as 'gemini'.
+        model (str): The model, such as 'gemini-1.5-flash'. Each model has its own quota.
+        requests_per_minute (Optional[float]): The request budget. Defaults to unlimited.
+        tokens_per_minute (Optional[float]): The token budget. Defaults to unlimited.
+
+    Returns:
+        RateLimiter: The same limiter for every caller of the same provider and model.
+
+    Raises:
+        ValueError: If the limiter already exists with other budgets.
+    """
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get((provider, model))
+        if limiter is None:
+            limiter = _rate_limiters[(provider, model)] = RateLimiter(requests_per_minute, tokens_per_minute)
+        elif (limiter.requests_per_minute, limiter.tokens_per_minute) != (requests_per_minute, tokens_per_minute):
+            raise ValueError(
+                f"The {provider}/{model} quota is already limited to {limiter.requests_per_minute} requests and "
+                f"{limiter.tokens_per_minute} tokens per minute, got {requests_per_minute} and {tokens_per_minute}"
+            )
+        return limiter
+
+
 class LLMProvider(ABC):
+    # The most tokens a prompt may have, None when unknown
+    input_token_limit = None
+    # Shared with the other providers on the same quota, None when calls are not limited
+    rate_limiter: Optional[RateLimiter] = None
+    priority = PRIORITY_ANALYSIS
+    # Where responses are looked up before calling the model, None to always call it
+    response_cache: Optional[LLMResponseCache] = None
+
     @abstractmethod
     def __init__(self, api_key: str):
         pass
@@ -15,6 +167,29 @@ class LLMProvider(ABC):
     def generate_query(self, user_interest: str, platform: str) -> str:
         pass
 
+    def count_tokens(self, text: str) -> int:
+        # Providers without a tokenizer at hand estimate it
+        return estimate_tokens(text)
+
+    def _cached(self, prompt: str, generate: Callable[[str], str]) -> str:
+        # Cached responses skip the rate limit and the retries, they cost nothing
+        temperature = getattr(self, 'temperature', None)
+        if self.response_cache is None or not self.response_cache.applies(temperature):
+            return generate(prompt)
+        key = self.response_cache.key(type(self).__name__, getattr(self, 'model_name', ''), temperature, prompt)
+        response = self.response_cache.get(key)
+        if response is None:
+            response = generate(prompt)
+            self.response_cache.put(key, response)
+        return response
+
+    def _wait_for_rate_limit(self, prompt: str):
+        # Counting exactly would cost a request of its own, an estimate is enough to pace calls
+        if self.rate_limiter is not None:
+            waited = self.rate_limiter.acquire(estimate_tokens(prompt), self.priority)
+            if waited > 1:
+                print(f"Waited {waited:.1f}s for the rate limit")
+
 
 class OpenAIProvider(LLMProvider):
     def __init__(self, api_key: str):
@@ -42,6 +217,9 @@ class HuggingFaceProvider(LLMProvider):
         )
         print("Model loaded successfully.")
 
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer(text)["input_ids"])
+
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=2, min=1, max=10),
@@ -82,10 +260,17 @@ class AnthropicProvider(LLMProvider):
 
 
 class GeminiProvider(LLMProvider):
-    def __init__(self, api_key: str, model_name: str = "gemini-1.5-flash", temperature: float = 0.0):
+    def __init__(self, api_key: str, model_name: str = "gemini-1.5-flash", temperature: float = 0.0,
+                 priority: int = PRIORITY_ANALYSIS, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None,
+                 response_cache: Optional[LLMResponseCache] = None):
         genai.configure(api_key=api_key)
         self.model_name = model_name
         self.temperature = temperature
+        self.priority = priority
+        # Every instance of the same model draws from one quota, whose budgets come from the config
+        self.rate_limiter = shared_rate_limiter("gemini", model_name, requests_per_minute, tokens_per_minute)
+        self.response_cache = response_cache
         
         # Create GenerationConfig with temperature
         generation_config = GenerationConfig(temperature=self.temperature)
@@ -94,6 +279,7 @@ class GeminiProvider(LLMProvider):
         self.model = genai.GenerativeModel(model_name=model_name, generation_config=generation_config)
         
         self.model_info = genai.get_model(f"models/{model_name}")
+        self.input_token_limit = self.model_info.input_token_limit
         
         # Print model name, temperature, and token limits
         print(f"Model: {model_name}")
@@ -101,19 +287,29 @@ class GeminiProvider(LLMProvider):
         print(f"Input token limit: {self.model_info.input_token_limit}")
         print(f"Output token limit: {self.model_info.output_token_limit}")
 
+    def generate_query(self, prompt: str) -> str:
+        return self._cached(prompt, self._generate_content)
+
     @retry(
         stop=stop_after_attempt(15),
         wait=wait_exponential(multiplier=2, min=4, max=10),
         retry=retry_if_exception_type(ResourceExhausted),
         reraise=True
     )
-    def generate_query(self, prompt: str) -> str:
+    def _generate_content(self, prompt: str) -> str:
+        self._wait_for_rate_limit(prompt)
         try:
             return self.model.generate_content(prompt).text
         except ResourceExhausted as e:
             print(f"Rate limit exceeded. Retrying... (Error: {e})")
             raise
 
+    def count_tokens(self, text: str) -> int:
+        # Counting is an API request too, it takes a request from the quota but no tokens
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(0, self.priority)
+        return self.model.count_tokens(text).total_tokens
+
 
 class LLMFactory:
     @staticmethod
@@ -128,6 +324,11 @@ class LLMFactory:
         elif provider_type.lower() == "gemini":
             model_name = kwargs.get("model_name", "gemini-1.5-flash")
             temperature = kwargs.get("temperature", 0.0)
-            return GeminiProvider(api_key, model_name, temperature)
+            priority = kwargs.get("priority", PRIORITY_ANALYSIS)
+            requests_per_minute = kwargs.get("requests_per_minute")
+            tokens_per_minute = kwargs.get("tokens_per_minute")
+            response_cache = kwargs.get("response_cache")
+            return GeminiProvider(api_key, model_name, temperature, priority, requests_per_minute, tokens_per_minute,
+                                  response_cache)
         else:
             raise ValueError(f"Unsupported provider type: {provider_type}")
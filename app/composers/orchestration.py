@@ -0,0 +1,144 @@
+"""
+Run composers concurrently as a dependency graph.
+
+The analysis composers only need the paper and the user's interests, so their LLM
+calls can all be in flight at the same time; the mail composer needs their outputs
+and starts as soon as they are in. A digest then takes about one analysis round trip
+plus the mail step instead of the sum of every call.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, List, Optional, Tuple
+from app.composers.thinkers import Composer
+
+
+class Output:
+    """
+    A placeholder for the output of another composer in the arguments of a compose call.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class ComposerGraph:
+    """
+    Composers and their compose arguments, run with every composer started as soon as the
+    outputs it takes as arguments are available.
+
+    Example:
+        graph = ComposerGraph(timeout=120)
+        graph.add('technical', technical_composer, paper, user_interests)
+        graph.add('mail', mail_composer, paper, Output('technical'), user_interests)
+        outputs, errors = graph.run()
+    """
+
+    def __init__(self, max_workers: int = 4, timeout: Optional[float] = None):
+        """
+        Initialize the ComposerGraph.
+
+        Args:
+            max_workers (int): The number of compose calls running at the same time. Defaults to 4.
+            timeout (Optional[float]): Seconds each compose call may take before it is given up on.
+                Defaults to no limit.
+        """
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._nodes: Dict[str, Tuple[Composer, Tuple, Dict[str, Any], Any]] = {}
+
+    def add(self, name: str, composer: Composer, *args, fallback: Any = None, **kwargs):
+        """
+        Add a compose call to the graph.
+
+        Args:
+            name (str): The name of the call's output, referred to by Output(name).
+            composer (Composer): The composer to call.
+            *args, **kwargs: The compose arguments, where Output placeholders are replaced by the
+                outputs of the other calls, which then run first.
+            fallback (Any): The output used in place of this call's if it fails or times out, so the
+                calls depending on it still run. Defaults to None, which makes them fail too.
+        """
+        for dependency in self._dependencies(args, kwargs):
+            if dependency not in self._nodes:
+                raise ValueError(f"'{name}' depends on '{dependency}', which must be added first")
+        self._nodes[name] = (composer, args, kwargs, fallback)
+
+    def run(self) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+        """
+        Run every compose call.
+
+        Returns:
+            Tuple[Dict[str, Any], Dict[str, Exception]]: The output of each call (or its fallback),
+                and the error of each call that failed, timed out or lost a dependency.
+        """
+        outputs, errors = {}, {}
+        pending = dict(self._nodes)
+        running = {}
+        # When each call started running, set by the call itself so time spent queued for a worker does not count
+        started = {}
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while pending or running:
+                for name in list(pending):
+                    composer, args, kwargs, fallback = pending[name]
+                    dependencies = self._dependencies(args, kwargs)
+                    if not all(dependency in outputs or dependency in errors for dependency in dependencies):
+                        continue
+                    del pending[name]
+                    missing = [dependency for dependency in dependencies if dependency not in outputs]
+                    if missing:
+                        self._fail(name, RuntimeError(f"'{name}' is missing the output of {missing}"), fallback, outputs, errors)
+                        continue
+                    args = [self._resolve(arg, outputs) for arg in args]
+                    kwargs = {key: self._resolve(value, outputs) for key, value in kwargs.items()}
+                    running[executor.submit(self._timed, started, name, composer, *args, **kwargs)] = (name, fallback)
+
+                if not running:
+                    continue
+                done, _ = wait(running, timeout=self._time_left(running, started), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, fallback = running.pop(future)
+                    try:
+                        outputs[name] = future.result()
+                    except Exception as e:
+                        self._fail(name, e, fallback, outputs, errors)
+                for future, (name, fallback) in list(running.items()):
+                    if self.timeout is not None and name in started and time.monotonic() - started[name] >= self.timeout:
+                        # The thread cannot be interrupted, its result is just not waited for
+                        del running[future]
+                        self._fail(name, TimeoutError(f"'{name}' took more than {self.timeout}s"), fallback, outputs, errors)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return outputs, errors
+
+    @staticmethod
+    def _timed(started: Dict[str, float], name: str, composer: Composer, *args, **kwargs) -> Any:
+        started[name] = time.monotonic()
+        return composer.compose(*args, **kwargs)
+
+    def _time_left(self, running: Dict, started: Dict[str, float]) -> Optional[float]:
+        if self.timeout is None:
+            return None
+        now = time.monotonic()
+        names = [name for name, _ in running.values()]
+        deadlines = [started[name] + self.timeout - now for name in names if name in started]
+        if len(deadlines) < len(names):
+            # A queued call starts its clock without waking us, so check back for it shortly
+            deadlines.append(min(self.timeout, 0.1))
+        return max(0.0, min(deadlines))
+
+    @staticmethod
+    def _fail(name: str, error: Exception, fallback: Any, outputs: Dict[str, Any], errors: Dict[str, Exception]):
+        print(f"Composer '{name}' failed: {type(error).__name__}: {error}")
+        errors[name] = error
+        if fallback is not None:
+            outputs[name] = fallback
+
+    @staticmethod
+    def _dependencies(args: Tuple, kwargs: Dict[str, Any]) -> List[str]:
+        return [arg.name for arg in (*args, *kwargs.values()) if isinstance(arg, Output)]
+
+    @staticmethod
+    def _resolve(value: Any, outputs: Dict[str, Any]) -> Any:
+        return outputs[value.name] if isinstance(value, Output) else value
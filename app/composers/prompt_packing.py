@@ -0,0 +1,141 @@
+from typing import Callable, List, Set, Tuple
+from app.composers.llms import estimate_tokens
+
+
+class PackingReport:
+    """
+    How a packed prompt used its token budget.
+    """
+
+    def __init__(self, budget: int, used: int, included: int, truncated: int, dropped: int):
+        self.budget = budget
+        self.used = used
+        self.included = included
+        self.truncated = truncated
+        self.dropped = dropped
+
+    def __str__(self):
+        return (f"{self.used}/{self.budget} tokens ({self.used / self.budget:.0%} of the budget), "
+                f"{self.included} papers, {self.truncated} truncated, {self.dropped} dropped")
+
+
+class PromptPacker:
+    """
+    Builds a prompt out of a header, a list of entries and a footer within a token budget.
+
+    Each entry is a (prefix, text, weight) triple. The budget left after the header,
+    footer and prefixes is shared between the texts in proportion to their weights;
+    texts shorter than their share give the rest back to the others, longer ones are
+    truncated at a word boundary. Entries whose share would fall below min_entry_tokens
+    are dropped, lowest weight first.
+
+    The plan uses the cheap estimate of llms.estimate_tokens, then the prompt is counted
+    with the model's tokenizer and repacked smaller if the estimate was too optimistic.
+    If it is still over after max_attempts, entries are dropped, lowest weight first,
+    until it fits: the packed prompt never exceeds the budget.
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int], budget: int, min_entry_tokens: int = 64):
+        """
+        Initialize the PromptPacker.
+
+        Args:
+            count_tokens (Callable[[str], int]): Counts the tokens of a text the way the model does.
+            budget (int): The maximum number of tokens of the prompt.
+            min_entry_tokens (int): The smallest share worth including an entry for. Defaults to 64.
+        """
+        self.count_tokens = count_tokens
+        self.budget = budget
+        self.min_entry_tokens = min_entry_tokens
+
+    def pack(self, header: str, entries: List[Tuple[str, str, float]], footer: str,
+             max_attempts: int = 3) -> Tuple[str, PackingReport]:
+        """
+        Pack the entries between the header and the footer.
+
+        Args:
+            header (str): The text before the entries, always kept whole.
+            entries (List[Tuple[str, str, float]]): (prefix, text, weight) of each entry, in prompt order.
+                The prefix is always kept whole, the text may be truncated.
+            footer (str): The text after the entries, always kept whole.
+            max_attempts (int): How many times to repack when the exact count is over budget, before
+                dropping entries. Defaults to 3.
+
+        Returns:
+            Tuple[str, PackingReport]: The prompt and how it used the budget.
+
+        Raises:
+            ValueError: If the header and footer alone are over the budget.
+        """
+        scale = 1.0
+        excluded = set()
+        attempts = 0
+        while True:
+            prompt, included, truncated = self._assemble(header, entries, footer, scale, excluded)
+            used = self.count_tokens(prompt)
+            if used <= self.budget:
+                break
+            if not included:
+                raise ValueError(f"The header and footer take {used} tokens, over the budget of {self.budget}")
+            # The estimate was off, shrink the texts by how much we went over
+            scale *= 0.95 * self.budget / used
+            attempts += 1
+            if attempts >= max_attempts:
+                # Still over, the least relevant entry makes room for the others
+                excluded.add(min(included, key=lambda i: entries[i][2]))
+        return prompt, PackingReport(self.budget, used, len(included), truncated, len(entries) - len(included))
+
+    def _assemble(self, header: str, entries: List[Tuple[str, str, float]], footer: str,
+                  scale: float, excluded: Set[int]) -> Tuple[str, Set[int], int]:
+        needs = [estimate_tokens(text) for _, text, _ in entries]
+        weights = [max(weight, 1e-9) for _, _, weight in entries]
+
+        included = set(range(len(entries))) - excluded
+        while included:
+            # Only the prefixes of the entries still in take room
+            fixed = (estimate_tokens(header) + estimate_tokens(footer)
+                     + sum(estimate_tokens(entries[i][0]) + 1 for i in included))
+            available = max(0.0, (self.budget - fixed) * scale)
+            shares = self._fill(needs, weights, included, available)
+            too_small = [i for i in included if shares[i] < min(needs[i], self.min_entry_tokens)]
+            if not too_small:
+                break
+            included.discard(min(too_small, key=lambda i: weights[i]))
+
+        parts = [header]
+        truncated = 0
+        for i, (prefix, text, _) in enumerate(entries):
+            if i not in included:
+                continue
+            if shares[i] < needs[i]:
+                text = self._truncate(text, shares[i])
+                truncated += 1
+            parts.append(f"{prefix}{text}\n\n")
+        parts.append(footer)
+        return ''.join(parts), included, truncated
+
+    @staticmethod
+    def _fill(needs: List[int], weights: List[float], included: set, available: float) -> dict:
+        # Weighted water filling: entries needing less than their share are given what they need
+        # and the rest is shared again between the others
+        shares = {}
+        open_entries = set(included)
+        while open_entries:
+            total_weight = sum(weights[i] for i in open_entries)
+            satisfied = [i for i in open_entries if needs[i] <= available * weights[i] / total_weight]
+            if not satisfied:
+                for i in open_entries:
+                    shares[i] = available * weights[i] / total_weight
+                break
+            for i in satisfied:
+                shares[i] = needs[i]
+                available -= needs[i]
+                open_entries.discard(i)
+        return shares
+
+    @staticmethod
+    def _truncate(text: str, tokens: float) -> str:
+        # Keep the fraction of the characters that the share is of the text's estimated tokens
+        cut = int(len(text) * tokens / estimate_tokens(text))
+        space = text.rfind(' ', 0, cut)
+        return text[:space if space > cut // 2 else cut].rstrip() + " [...]"
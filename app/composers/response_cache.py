@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class LLMResponseCache:
+    """
+    A persistent cache of LLM responses.
+
+    Responses are keyed by a hash of (provider, model, temperature, prompt), so re-running a
+    digest for the same user and week, or after a crash, gets back the responses already paid
+    for. By default only temperature 0 calls are cached, the others are expected to vary.
+    Entries expire after ttl seconds, and the least recently used are evicted once the
+    responses stored exceed max_bytes.
+    """
+
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600, max_bytes: int = 256 << 20,
+                 deterministic_only: bool = True):
+        """
+        Initialize the LLMResponseCache.
+
+        Args:
+            path (str): The file path of the SQLite database, created if it does not exist.
+            ttl (float): Seconds a response is served for. Defaults to a week.
+            max_bytes (int): The size of the stored responses above which the least recently used
+                are evicted. Defaults to 256 MiB.
+            deterministic_only (bool): Only cache calls at temperature 0. Defaults to True.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.deterministic_only = deterministic_only
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT, size INTEGER, created REAL, last_used REAL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.connection.commit()
+
+    def applies(self, temperature: float) -> bool:
+        return not self.deterministic_only or temperature == 0
+
+    @staticmethod
+    def key(provider: str, model: str, temperature: float, prompt: str) -> str:
+        return hashlib.sha256(json.dumps([provider, model, temperature, prompt]).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a response, None if it is not cached or has expired.
+        """
+        now = time.time()
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT response FROM responses WHERE key = ? AND created > ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.connection.commit()
+        return row[0]
+
+    def put(self, key: str, response: str):
+        """
+        Store a response, then drop expired entries and evict past the size cap.
+        """
+        now = time.time()
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response.encode('utf-8')), now, now)
+            )
+            self.connection.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl,))
+            total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total_bytes > self.max_bytes:
+                evicted = []
+                for key, size in self.connection.execute("SELECT key, size FROM responses ORDER BY last_used"):
+                    if total_bytes <= self.max_bytes:
+                        break
+                    evicted.append((key,))
+                    total_bytes -= size
+                self.connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+            self.connection.commit()
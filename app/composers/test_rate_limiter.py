@@ -0,0 +1,128 @@
+"""
+Check the pacing and priority order of the RateLimiter with a fake clock and a fake provider.
+
+Time only moves when a check advances the fake clock, by steps that refill exactly one
+request or token, so when and in which order the calls go through does not depend on how
+fast the machine is.
+
+Runs under pytest, or as a script that exits with an error when a check fails:
+    python -m app.composers.test_rate_limiter
+"""
+
+import sys
+import threading
+import time
+from typing import Callable, List, Tuple
+from app.composers.llms import (
+    LLMProvider, RateLimiter, PRIORITY_SELECTION, PRIORITY_ANALYSIS, PRIORITY_MAIL, estimate_tokens
+)
+
+# A power of two, so the fake times are exact in floating point
+PER_SECOND = 64
+STEP = 1 / PER_SECOND
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+class FakeProvider(LLMProvider):
+    """
+    Records the prompt and the fake time of every call let through by its rate limiter.
+    """
+
+    def __init__(self, api_key: str, rate_limiter: RateLimiter, priority: int, calls: List[Tuple[str, float]]):
+        self.rate_limiter = rate_limiter
+        self.priority = priority
+        self.calls = calls
+
+    def generate_query(self, prompt: str) -> str:
+        self._wait_for_rate_limit(prompt)
+        self.calls.append((prompt, self.rate_limiter.clock()))
+        return prompt
+
+
+def wait_until(predicate: Callable[[], bool], timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+def test_pacing():
+    # The token bucket refills one token per step and starts empty
+    clock = FakeClock()
+    limiter = RateLimiter(tokens_per_minute=60 * PER_SECOND, clock=clock)
+    limiter.acquire(60 * PER_SECOND)
+    calls = []
+    provider = FakeProvider(None, limiter, PRIORITY_ANALYSIS, calls)
+    prompt = 'x' * 124
+    tokens = estimate_tokens(prompt)
+    thread = threading.Thread(target=lambda: [provider.generate_query(prompt) for _ in range(3)])
+    thread.start()
+    try:
+        for i in range(3):
+            # Not a step before the bucket holds the prompt's tokens, then right away
+            clock.advance((tokens - 1) * STEP)
+            assert not wait_until(lambda: len(calls) > i, timeout=0.1), f"call {i} went through early"
+            clock.advance(STEP)
+            assert wait_until(lambda: len(calls) > i), f"call {i} did not go through"
+    finally:
+        clock.advance(60)
+        thread.join()
+    assert [at for _, at in calls] == [tokens * STEP, 2 * tokens * STEP, 3 * tokens * STEP]
+
+
+def test_priority_order():
+    # The request bucket refills one request per step and starts empty
+    clock = FakeClock()
+    limiter = RateLimiter(requests_per_minute=60 * PER_SECOND, clock=clock)
+    for _ in range(60 * PER_SECOND):
+        limiter.acquire()
+    calls = []
+    threads = []
+    arrivals = [('mail-0', PRIORITY_MAIL), ('analysis-0', PRIORITY_ANALYSIS), ('selection-0', PRIORITY_SELECTION),
+                ('mail-1', PRIORITY_MAIL), ('analysis-1', PRIORITY_ANALYSIS), ('selection-1', PRIORITY_SELECTION)]
+    for i, (prompt, priority) in enumerate(arrivals):
+        provider = FakeProvider(None, limiter, priority, calls)
+        threads.append(threading.Thread(target=provider.generate_query, args=(prompt,)))
+        threads[-1].start()
+        # Every caller is queued before the next one arrives
+        assert wait_until(lambda: len(limiter._queue) == i + 1)
+    try:
+        for i in range(len(arrivals)):
+            clock.advance(STEP)
+            assert wait_until(lambda: len(calls) > i), f"call {i} did not go through"
+    finally:
+        clock.advance(60)
+        for thread in threads:
+            thread.join()
+    assert calls == [('selection-0', 1 * STEP), ('selection-1', 2 * STEP), ('analysis-0', 3 * STEP),
+                     ('analysis-1', 4 * STEP), ('mail-0', 5 * STEP), ('mail-1', 6 * STEP)]
+    assert sorted(limiter.metrics()) == [PRIORITY_SELECTION, PRIORITY_ANALYSIS, PRIORITY_MAIL]
+
+
+def main():
+    failures = 0
+    for check in (test_pacing, test_priority_order):
+        try:
+            check()
+            print(f"{check.__name__}: ok")
+        except AssertionError as e:
+            print(f"{check.__name__}: FAILED {e}")
+            failures += 1
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
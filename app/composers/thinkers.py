@@ -6,7 +6,7 @@ HistoryOfScienceComposer: He's always reminding episodes of great scientists...
 MailComposer: He's a storyteller...
 """
 from abc import ABC, abstractmethod
-from app.composers.llms import LLMFactory
+from app.composers.llms import LLMFactory, PRIORITY_MAIL
 import os
 from dotenv import load_dotenv
 
@@ -86,6 +86,8 @@ class HistoryOfScienceComposer(Composer):
 
 class MailComposer(Composer):
     def __init__(self, llm_provider: str = "gemini", **llm_kwargs):
+        # The mail comes last, its calls wait behind selection and analysis ones
+        llm_kwargs.setdefault("priority", PRIORITY_MAIL)
         super().__init__(llm_provider, **llm_kwargs)
 
     def compose(self, paper, technical_analysis, philosopher_analysis, first_principles_analysis, history_of_science_analysis, 
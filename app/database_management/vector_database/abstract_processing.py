@@ -1,79 +1,137 @@
-import json
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Tuple, Optional
 import numpy as np
 from tqdm import tqdm
 from app.database_management.vectorizer.vectorizer_interface import IVectorizer
+from app.database_management.vectorizer.embedding_cache import EmbeddingCache
 from app.database_management.vector_database.vector_database import VectorDatabase
+from app.database_management.vector_database.article_reader import ArticleReader
 
 class AbstractProcessingService:
     """
     A service for processing and storing abstracts in a vector database.
 
-    This class provides functionality to process abstracts from a JSON file,
+    This class provides functionality to process abstracts from a JSON or JSONL file,
     vectorize them, and store them in a vector database. Here we use a strategy
     pattern to allow for different vectorizers like tfidf, bert, word2vec, etc.
     And different 'vector_databases' like faiss, annoy, etc. to perform the search,
     and store of the vectors.
     """
 
-    def __init__(self, vectorizer: IVectorizer, vector_database: VectorDatabase):
+    def __init__(self, vectorizer: IVectorizer, vector_database: VectorDatabase,
+                 embedding_cache: Optional[EmbeddingCache] = None):
         """
         Initialize the AbstractProcessingService.
 
         Args:
             vectorizer (IVectorizer): An instance of a vectorizer to convert text to vectors.
             vector_database (VectorDatabase): An instance of a vector database to store the vectors.
+            embedding_cache (Optional[EmbeddingCache]): A cache of previously computed vectors,
+                checked before calling the vectorizer. Defaults to None (no caching). Ignored when
+                the vectorizer has no cache_name.
         """
         self.vectorizer = vectorizer
         self.vector_database = vector_database
+        self.embedding_cache = embedding_cache if vectorizer.cache_name is not None else None
 
     def process_and_store_abstracts(self, json_file_path: str, batch_size: int = 100):
         """
-        Process abstracts from a JSON file and store them in the vector database.
+        Process abstracts from a JSON or JSONL file and store them in the vector database.
 
-        This method reads a JSON file containing article data, processes each abstract,
-        vectorizes it, and stores it in the vector database in batches.
+        This method streams the articles out of the file, groups the abstracts into
+        batches, vectorizes each batch with a single call to the vectorizer and stores
+        it in the vector database. Only one batch is held in memory at a time.
 
         Args:
-            json_file_path (str): The path to the JSON file containing the article data.
+            json_file_path (str): The path to the file containing the article data, either
+                JSONL (optionally .gz) or the legacy '{source: [articles]}' JSON layout.
             batch_size (int, optional): The number of articles to process in each batch. Defaults to 100.
         """
-        with open(json_file_path, 'r') as file:
-            data = json.load(file)
-
-        total_articles = sum(len(articles) for articles in data.values())
+        reader = ArticleReader(json_file_path)
         processed_articles = 0
 
-        batch = []
-        with tqdm(total=total_articles, desc="Processing abstracts") as pbar:
-            for source, articles in data.items():
-                for article in articles:
-                    abstract = article['abstract']
-                    vector = self.vectorizer.vectorize_text(abstract)
-                    metadata = {
-                        "title": article['title'],
-                        "id": article['id'],
-                        "updated": article['updated'],
-                        "pdf_url": article['pdf_url'],
-                        "source": source,
-                    }
-                    batch.append((article['id'], vector, metadata))
-
-                    if len(batch) >= batch_size:
-                        self._store_batch(batch)
-                        batch = []
-
-                    processed_articles += 1
-                    pbar.update(1)
-                    pbar.set_postfix({"Completion": f"{processed_articles/total_articles:.2%}"})
-
-            if batch:  # Store any remaining items
-                self._store_batch(batch)
+        pending = []
+        with tqdm(total=reader.total_bytes, desc="Processing abstracts", unit='B', unit_scale=True) as pbar:
+            def update_progress():
+                pbar.update(reader.bytes_read - pbar.n)
+                pbar.set_postfix({"Articles": processed_articles})
+
+            for source, article in reader:
+                pending.append(self.pending_article(source, article))
+
+                if len(pending) >= batch_size:
+                    self.store_batch(self.vectorize_batch(pending))
+                    processed_articles += len(pending)
+                    update_progress()
+                    pending = []
+
+            if pending:  # Store any remaining items
+                self.store_batch(self.vectorize_batch(pending))
+                processed_articles += len(pending)
+            pbar.update(reader.total_bytes - pbar.n)
+            pbar.set_postfix({"Articles": processed_articles})
 
         # Save the database after processing all abstracts
+        self.save()
+
+    def pending_article(self, source: str, article: Dict[str, Any]) -> Tuple[str, str, Dict[str, Any]]:
+        """
+        Turn an article into the (id, abstract, metadata) tuple waiting to be vectorized.
+
+        Args:
+            source (str): The source the article was fetched from.
+            article (Dict[str, Any]): The article, as read from a file or yielded by a retriever.
+
+        Returns:
+            Tuple[str, str, Dict[str, Any]]: The article ID, its abstract and the metadata stored with its vector.
+        """
+        updated = article['updated']
+        metadata = {
+            "title": article['title'],
+            "id": article['id'],
+            # Retrievers yield datetimes, files already hold ISO strings
+            "updated": updated if isinstance(updated, str) else updated.isoformat(),
+            "pdf_url": article['pdf_url'],
+            "source": source,
+            # Kept so papers can be selected from their abstracts without downloading their PDFs
+            "abstract": article['abstract'],
+        }
+        return article['id'], article['abstract'], metadata
+
+    def save(self):
+        """
+        Save the vector database, and the embedding cache if there is one.
+        """
         self.vector_database.save()
+        if self.embedding_cache is not None:
+            self.embedding_cache.save()
+            print(f"Embedding cache: {self.embedding_cache.hits} hits, {self.embedding_cache.misses} misses")
+
+    def vectorize_batch(self, pending: List[Tuple[str, str, Dict[str, Any]]]) -> List[Tuple[str, np.ndarray, Dict[str, Any]]]:
+        """
+        Vectorize a batch of abstracts with a single vectorizer call.
+
+        Args:
+            pending (List[Tuple[str, str, Dict[str, Any]]]): A list of tuples containing
+                the article ID, abstract text, and metadata for each article.
+
+        Returns:
+            List[Tuple[str, np.ndarray, Dict[str, Any]]]: The same articles with the abstract
+                replaced by its vector representation.
+        """
+        abstracts = [abstract for _, abstract, _ in pending]
+        if self.embedding_cache is None:
+            vectors = self.vectorizer.vectorize_batch(abstracts)
+        else:
+            # Only the abstracts never seen before go through the model
+            vectors, missing = self.embedding_cache.lookup(abstracts)
+            if missing:
+                missing_abstracts = [abstracts[i] for i in missing]
+                computed = self.vectorizer.vectorize_batch(missing_abstracts)
+                vectors[missing] = computed
+                self.embedding_cache.put(missing_abstracts, computed)
+        return [(id, vector, metadata) for (id, _, metadata), vector in zip(pending, vectors)]
 
-    def _store_batch(self, batch: List[Tuple[str, np.ndarray, Dict[str, Any]]]):
+    def store_batch(self, batch: List[Tuple[str, np.ndarray, Dict[str, Any]]]):
         """
         Store a batch of processed articles in the vector database.
 
@@ -81,5 +139,7 @@ class AbstractProcessingService:
             batch (List[Tuple[str, np.ndarray, Dict[str, Any]]]): A list of tuples containing
                 the article ID, vector representation, and metadata for each article.
         """
-        for id, vector, metadata in batch:
-            self.vector_database.add_vector(id, vector, metadata)
\ No newline at end of file
+        if not batch:
+            return
+        ids, vectors, metadatas = zip(*batch)
+        self.vector_database.add_vectors(list(ids), np.stack(vectors), list(metadatas))
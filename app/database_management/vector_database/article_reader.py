@@ -0,0 +1,117 @@
+import gzip
+import io
+import json
+import os
+from typing import Dict, Any, Iterator, Tuple
+
+
+class ArticleReader:
+    """
+    Streams (source, article) pairs out of a weekly articles file in constant memory.
+
+    Two layouts are supported:
+        - JSONL, one article per line with its 'source' (optionally gzip compressed,
+          as written by WeeklyArticleFetcher.stream_last_week_articles_to_jsonl).
+        - The legacy '{source: [articles]}' JSON document, parsed incrementally one
+          article at a time instead of being loaded whole.
+
+    Progress is measured in bytes of the file on disk, which is known upfront and
+    costs nothing to track.
+    """
+
+    def __init__(self, file_path: str, chunk_size: int = 1 << 16):
+        """
+        Initialize the ArticleReader.
+
+        Args:
+            file_path (str): The path of a .json, .jsonl or .jsonl.gz articles file.
+            chunk_size (int): The number of characters read at a time from a JSON document.
+        """
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.total_bytes = os.path.getsize(file_path)
+        self._raw = None
+
+    @property
+    def bytes_read(self) -> int:
+        return self._raw.tell() if self._raw is not None and not self._raw.closed else 0
+
+    def __iter__(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        with open(self.file_path, 'rb') as raw:
+            self._raw = raw
+            binary = gzip.GzipFile(fileobj=raw) if self.file_path.endswith('.gz') else raw
+            text = io.TextIOWrapper(binary, encoding='utf-8')
+            if self.file_path.endswith('.json'):
+                yield from self._iter_json(text)
+            else:
+                yield from self._iter_jsonl(text)
+
+    def _iter_jsonl(self, text: io.TextIOBase) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for line in text:
+            if line.strip():
+                article = json.loads(line)
+                yield article.pop('source'), article
+
+    def _iter_json(self, text: io.TextIOBase) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        decoder = json.JSONDecoder()
+        buffer = ''
+        position = 0
+
+        def next_token() -> str:
+            # Skip whitespace, reading more of the file as needed, and peek the next character
+            nonlocal buffer, position
+            while True:
+                while position < len(buffer) and buffer[position].isspace():
+                    position += 1
+                if position < len(buffer):
+                    return buffer[position]
+                buffer, position = text.read(self.chunk_size), 0
+                if not buffer:
+                    raise ValueError(f"Unexpected end of {self.file_path}")
+
+        def expect(character: str):
+            nonlocal position
+            if next_token() != character:
+                raise ValueError(f"Expected '{character}' in {self.file_path}, got '{buffer[position]}'")
+            position += 1
+
+        def decode_value() -> Any:
+            # Decode the next complete value, growing the buffer until it holds one
+            nonlocal buffer, position
+            next_token()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    chunk = text.read(self.chunk_size)
+                    if not chunk:
+                        raise
+                    buffer, position = buffer[position:] + chunk, 0
+                    continue
+                # Keys and articles are strings and objects, which cannot be cut short
+                # and still decode, so a successful decode is always the whole value
+                position = end
+                return value
+
+        expect('{')
+        if next_token() == '}':
+            return
+        while True:
+            source = decode_value()
+            expect(':')
+            expect('[')
+            if next_token() == ']':
+                position += 1
+            else:
+                while True:
+                    yield source, decode_value()
+                    if next_token() == ',':
+                        position += 1
+                        continue
+                    expect(']')
+                    break
+            if next_token() == ',':
+                position += 1
+                continue
+            expect('}')
+            return
@@ -0,0 +1,98 @@
+"""
+Compare approximate FAISS index types against the exact flat index.
+
+For each index type and search setting this reports recall@k against the flat
+index results, together with p50/p99 single-query latency, so an operating point
+can be chosen for the 'index_type', 'index_params' and 'search_params' config.
+
+Vectors are read from an existing flat index file, or drawn at random when no
+file is given.
+"""
+
+import argparse
+import time
+from typing import Dict, Any, Tuple
+import numpy as np
+import faiss
+from app.database_management.vector_database.vector_database import build_index
+
+# (index type, build params, list of search params to sweep)
+CANDIDATES = [
+    ('ivf_flat', {'nlist': 1024}, [{'nprobe': 1}, {'nprobe': 8}, {'nprobe': 32}, {'nprobe': 128}]),
+    ('ivf_pq', {'nlist': 1024, 'm': 64, 'nbits': 8}, [{'nprobe': 8}, {'nprobe': 32}, {'nprobe': 128}]),
+    ('hnsw', {'M': 32}, [{'efSearch': 16}, {'efSearch': 64}, {'efSearch': 256}]),
+]
+
+
+def load_vectors(index_file: str, num_vectors: int, dimension: int) -> np.ndarray:
+    if index_file:
+        # The read index owns what its downcasts point to, it must stay referenced while they are used
+        index = faiss.read_index(index_file)
+        wrapper = faiss.downcast_index(index)
+        if isinstance(wrapper, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+            # Row ids of a stable-ids index have gaps once entries are evicted or replaced,
+            # the vectors are stored contiguously in the wrapped index
+            inner = faiss.downcast_index(wrapper.index)
+            return inner.reconstruct_n(0, inner.ntotal)
+        return index.reconstruct_n(0, index.ntotal)
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((num_vectors, dimension)).astype(np.float32)
+
+
+def timed_search(index: faiss.Index, queries: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    latencies = np.zeros(len(queries))
+    indices = np.zeros((len(queries), top_k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, indices[i] = index.search(query.reshape(1, -1), top_k)
+        latencies[i] = time.perf_counter() - start
+    return indices, latencies
+
+
+def recall_at_k(indices: np.ndarray, ground_truth: np.ndarray) -> float:
+    hits = sum(len(np.intersect1d(found, truth)) for found, truth in zip(indices, ground_truth))
+    return hits / ground_truth.size
+
+
+def report(name: str, params: Dict[str, Any], recall: float, latencies: np.ndarray):
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print(f"{name:<10} {str(params):<20} recall@k={recall:.3f}  p50={p50:.3f}ms  p99={p99:.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--index-file', default=None, help="flat FAISS index to take the vectors from, stable ids or not")
+    parser.add_argument('--num-vectors', type=int, default=100_000)
+    parser.add_argument('--dimension', type=int, default=768)
+    parser.add_argument('--num-queries', type=int, default=500)
+    parser.add_argument('--top-k', type=int, default=20)
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.index_file, args.num_vectors, args.dimension)
+    dimension = vectors.shape[1]
+    # Queries are perturbed database vectors, close to how user interests land near papers
+    rng = np.random.default_rng(1)
+    rows = rng.choice(len(vectors), size=args.num_queries, replace=False)
+    queries = vectors[rows] + 0.1 * vectors.std() * rng.standard_normal((args.num_queries, dimension)).astype(np.float32)
+    print(f"{len(vectors)} vectors of dimension {dimension}, {args.num_queries} queries, k={args.top_k}\n")
+
+    flat = build_index(dimension, 'flat')
+    flat.add(vectors)
+    ground_truth, latencies = timed_search(flat, queries, args.top_k)
+    report('flat', {}, 1.0, latencies)
+
+    parameter_space = faiss.ParameterSpace()
+    for index_type, index_params, sweep in CANDIDATES:
+        index = build_index(dimension, index_type, index_params)
+        if not index.is_trained:
+            index.train(vectors)
+        index.add(vectors)
+        for search_params in sweep:
+            for name, value in search_params.items():
+                parameter_space.set_index_parameter(index, name, value)
+            indices, latencies = timed_search(index, queries, args.top_k)
+            report(index_type, search_params, recall_at_k(indices, ground_truth), latencies)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""
+Settings shared by the vector database scripts.
+"""
+
+# Entries whose last update is older than this many days are evicted after each run
+WINDOW_DAYS = 90
@@ -0,0 +1,223 @@
+"""
+Single pipelined ingest command: fetch -> embed -> index.
+
+Instead of handing off through a dated JSON file between three scripts, the
+stages run at the same time and are connected by bounded queues, so network
+fetching, model inference and FAISS insertion overlap. When a downstream stage
+falls behind, its full input queue blocks the stage feeding it (backpressure).
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Tuple
+from app.fetchers.fetchers import ArticleRetriever, ArXivRetriever, BioRxivRetriever
+from app.database_management.vectorizer.bert import HuggingFaceVectorizer
+from app.database_management.vectorizer.embedding_cache import EmbeddingCache
+from app.database_management.vector_database.vector_database import FaissVectorDatabase
+from app.database_management.vector_database.abstract_processing import AbstractProcessingService
+from app.database_management.vector_database.config import WINDOW_DAYS
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+class _Stopped(Exception):
+    pass
+
+
+class StageStats:
+    """
+    Throughput and input queue depth of one pipeline stage.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.depth_samples = 0
+        self.depth_total = 0
+        self.max_depth = 0
+        self._lock = threading.Lock()
+
+    def record(self, items: int, busy_seconds: float, input_depth: int = 0):
+        with self._lock:
+            self.items += items
+            self.busy_seconds += busy_seconds
+            self.depth_samples += 1
+            self.depth_total += input_depth
+            self.max_depth = max(self.max_depth, input_depth)
+
+    def __str__(self):
+        throughput = self.items / self.busy_seconds if self.busy_seconds else 0.0
+        mean_depth = self.depth_total / self.depth_samples if self.depth_samples else 0.0
+        return (f"{self.name:<6} {self.items:>8} articles  {throughput:>10.1f} articles/s busy  "
+                f"input queue depth mean {mean_depth:.1f} max {self.max_depth}")
+
+
+class IngestPipeline:
+    """
+    Runs the fetch, embedding and indexing stages concurrently with bounded queues between them.
+    """
+
+    def __init__(self, retrievers: Dict[str, ArticleRetriever], processing_service: AbstractProcessingService,
+                 batch_size: int = 100, queue_size: int = 8):
+        """
+        Initialize the IngestPipeline.
+
+        Args:
+            retrievers (Dict[str, ArticleRetriever]): The retriever of each source, fetched concurrently.
+            processing_service (AbstractProcessingService): Provides the vectorizer, embedding cache
+                and vector database used by the embedding and indexing stages.
+            batch_size (int): The number of articles vectorized and indexed at a time. Defaults to 100.
+            queue_size (int): The capacity, in pages or batches, of each queue between stages. Defaults to 8.
+        """
+        self.retrievers = retrievers
+        self.processing_service = processing_service
+        self.batch_size = batch_size
+        self.pages = queue.Queue(maxsize=queue_size)
+        self.batches = queue.Queue(maxsize=queue_size)
+        self.stats = {name: StageStats(name) for name in ('fetch', 'embed', 'index')}
+        self._stop = threading.Event()
+        self._errors = []
+
+    def run(self, start_date: datetime, end_date: datetime) -> int:
+        """
+        Fetch, embed and index every article updated between the two dates.
+
+        Returns:
+            int: The number of articles indexed.
+        """
+        with ThreadPoolExecutor(max_workers=len(self.retrievers) + 1) as executor:
+            for source, retriever in self.retrievers.items():
+                executor.submit(self._guard, self._fetch_stage, source, retriever, start_date, end_date)
+            executor.submit(self._guard, self._embed_stage)
+            self._guard(self._index_stage)
+        if self._errors:
+            raise self._errors[0]
+        self.processing_service.save()
+        return self.stats['index'].items
+
+    def report(self):
+        print("\n--- Ingest pipeline ---")
+        for stats in self.stats.values():
+            print(stats)
+
+    def _fetch_stage(self, source: str, retriever: ArticleRetriever, start_date: datetime, end_date: datetime):
+        try:
+            started = time.perf_counter()
+            for page in retriever.iter_pages(start_date, end_date):
+                pending = [self.processing_service.pending_article(source, article) for article in page]
+                self.stats['fetch'].record(len(pending), time.perf_counter() - started)
+                self._put(self.pages, pending)
+                started = time.perf_counter()
+        finally:
+            self._put(self.pages, _DONE, force=True)
+
+    def _embed_stage(self):
+        remaining_fetchers = len(self.retrievers)
+        pending: List[Tuple[str, str, Dict[str, Any]]] = []
+        try:
+            while remaining_fetchers:
+                depth = self.pages.qsize()
+                page = self._get(self.pages)
+                if page is _DONE:
+                    remaining_fetchers -= 1
+                    continue
+                pending.extend(page)
+                while len(pending) >= self.batch_size:
+                    self._embed(pending[:self.batch_size], depth)
+                    pending = pending[self.batch_size:]
+            if pending:
+                self._embed(pending, self.pages.qsize())
+        finally:
+            self._put(self.batches, _DONE, force=True)
+
+    def _embed(self, pending: List[Tuple[str, str, Dict[str, Any]]], input_depth: int):
+        started = time.perf_counter()
+        batch = self.processing_service.vectorize_batch(pending)
+        self.stats['embed'].record(len(batch), time.perf_counter() - started, input_depth)
+        self._put(self.batches, batch)
+
+    def _index_stage(self):
+        while True:
+            depth = self.batches.qsize()
+            batch = self._get(self.batches)
+            if batch is _DONE:
+                return
+            started = time.perf_counter()
+            self.processing_service.store_batch(batch)
+            self.stats['index'].record(len(batch), time.perf_counter() - started, depth)
+
+    def _guard(self, stage, *args):
+        # The first failing stage stops the others instead of leaving them blocked on a queue
+        try:
+            stage(*args)
+        except _Stopped:
+            pass
+        except Exception as e:
+            self._errors.append(e)
+            self._stop.set()
+        except BaseException:
+            # A KeyboardInterrupt or SystemExit also stops the other stages before propagating
+            self._stop.set()
+            raise
+
+    def _put(self, stage_queue: queue.Queue, item, force: bool = False):
+        while True:
+            if self._stop.is_set() and not force:
+                raise _Stopped()
+            try:
+                stage_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self._stop.is_set():
+                    if force:
+                        return
+                    raise _Stopped()
+
+    def _get(self, stage_queue: queue.Queue):
+        while True:
+            if self._stop.is_set():
+                raise _Stopped()
+            try:
+                return stage_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+
+def main():
+    data_dir = 'data'
+    index_file = os.path.join(data_dir, 'bge_vector_database_faiss_index.bin')
+    metadata_file = os.path.join(data_dir, 'bge_vector_database_metadata.sqlite')
+    os.makedirs(data_dir, exist_ok=True)
+
+    vectorizer = HuggingFaceVectorizer(model_name='BAAI/bge-base-en-v1.5')
+    vector_dimension = 768
+    vector_database = FaissVectorDatabase(dimension=vector_dimension, index_file=index_file, metadata_file=metadata_file,
+                                          index_type='flat', stable_ids=True)
+    embedding_cache = None
+    if vectorizer.cache_name is not None:
+        embedding_cache = EmbeddingCache(os.path.join(data_dir, 'embedding_cache'), vectorizer.cache_name, vector_dimension)
+    processing_service = AbstractProcessingService(vectorizer, vector_database, embedding_cache)
+
+    pipeline = IngestPipeline({"arxiv": ArXivRetriever(), "biorxiv": BioRxivRetriever()}, processing_service)
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=7)
+    print(f"Ingesting articles from {start_date} to {end_date}")
+    started = time.perf_counter()
+    total_articles = pipeline.run(start_date, end_date)
+    elapsed = time.perf_counter() - started
+    pipeline.report()
+    print(f"\nIndexed {total_articles} articles in {elapsed:.1f}s ({total_articles / elapsed:.1f} articles/s)")
+
+    evicted = vector_database.evict_older_than(datetime.now() - timedelta(days=WINDOW_DAYS))
+    vector_database.save()
+    print(f"Evicted {evicted} entries older than {WINDOW_DAYS} days")
+    print(f"Total vectors in database: {len(vector_database)}")
+
+if __name__ == "__main__":
+    main()
@@ -3,15 +3,19 @@ from app.database_management.vectorizer.bert import BertVectorizer
 from app.database_management.vectorizer.bert import HuggingFaceVectorizer
 from app.database_management.vector_database.vector_database import FaissVectorDatabase
 from app.database_management.vector_database.abstract_processing import AbstractProcessingService
+from app.database_management.vectorizer.embedding_cache import EmbeddingCache
+from app.database_management.vector_database.config import WINDOW_DAYS
 
 def main():
     # Define paths
-    from datetime import datetime
+    from datetime import datetime, timedelta
 
     data_dir = 'data'
     current_date = datetime.now().strftime('%Y%m%d')
-    index_file = os.path.join(data_dir, f'bge_vector_database_faiss_index_{current_date}.bin')
-    metadata_file = os.path.join(data_dir, f'bge_vector_database_metadata_{current_date}.pkl')
+    # A single long-lived index: each run only adds the new week, replaces re-versioned
+    # papers in place and drops what fell out of the window
+    index_file = os.path.join(data_dir, 'bge_vector_database_faiss_index.bin')
+    metadata_file = os.path.join(data_dir, 'bge_vector_database_metadata.sqlite')
 
     # Ensure data directory exists
     os.makedirs(data_dir, exist_ok=True)
@@ -21,13 +25,24 @@ def main():
     vector_dimension = 768 # BERT base model output dimension
 
     # We choose a vector database admin, in this case we use Faiss
-    vector_database = FaissVectorDatabase(dimension=vector_dimension, index_file=index_file, metadata_file=metadata_file)
-    processing_service = AbstractProcessingService(vectorizer, vector_database)
+    # 'flat' keeps exact search, 'ivf_flat', 'ivf_pq' or 'hnsw' build an approximate index instead
+    index_type = 'flat'
+    vector_database = FaissVectorDatabase(dimension=vector_dimension, index_file=index_file, metadata_file=metadata_file,
+                                          index_type=index_type, stable_ids=True)
+
+    # Re-versioned papers come back with the same abstract, so we reuse their vectors
+    embedding_cache = None
+    if vectorizer.cache_name is not None:
+        embedding_cache = EmbeddingCache(os.path.join(data_dir, 'embedding_cache'), vectorizer.cache_name, vector_dimension)
+    processing_service = AbstractProcessingService(vectorizer, vector_database, embedding_cache)
 
     # Process and store abstracts
-    processing_service.process_and_store_abstracts(f'database/weekly_articles_{current_date}.json')
+    processing_service.process_and_store_abstracts(f'database/weekly_articles_{current_date}.jsonl')
 
-    print(f"\nTotal vectors in database: {len(vector_database)}")
+    evicted = vector_database.evict_older_than(datetime.now() - timedelta(days=WINDOW_DAYS))
+    vector_database.save()
+    print(f"\nEvicted {evicted} entries older than {WINDOW_DAYS} days")
+    print(f"Total vectors in database: {len(vector_database)}")
 
     # Example search
     #query = "machine learning in biology"
@@ -0,0 +1,261 @@
+import json
+import os
+import pickle
+import re
+import sqlite3
+import sys
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+# Metadata fields stored in their own columns, anything else goes in a JSON column
+COLUMNS = ('id', 'title', 'updated', 'pdf_url', 'source')
+
+
+def paper_key(id: str) -> str:
+    """
+    The identity of a paper across its versions: arXiv ids lose their 'vN' suffix,
+    bioRxiv DOIs are already version independent.
+    """
+    return re.sub(r'v\d+$', '', id)
+
+
+class MetadataStore:
+    """
+    A SQLite-backed store of vector metadata, keyed by FAISS row id.
+
+    Opening the store reads nothing but the schema; rows are fetched from disk
+    only when they are asked for, so a search only pays for its hits instead of
+    every process unpickling the metadata of the whole index at startup.
+    """
+
+    def __init__(self, path: str, read_only: bool = False):
+        """
+        Initialize the MetadataStore.
+
+        Args:
+            path (str): The file path of the SQLite database, created if it does not exist.
+            read_only (bool): Open an existing database without write access. Defaults to False.
+        """
+        self.path = path
+        self.read_only = read_only
+        if read_only:
+            self.connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            return
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            "row_id INTEGER PRIMARY KEY, "
+            + ", ".join(f"{column} TEXT" for column in COLUMNS)
+            + ", extra TEXT, paper_key TEXT)"
+        )
+        existing_columns = [row[1] for row in self.connection.execute("PRAGMA table_info(metadata)")]
+        if 'paper_key' not in existing_columns:
+            # Stores created before paper keys existed
+            self.connection.execute("ALTER TABLE metadata ADD COLUMN paper_key TEXT")
+            rows = self.connection.execute("SELECT row_id, id FROM metadata WHERE id IS NOT NULL").fetchall()
+            self.connection.executemany(
+                "UPDATE metadata SET paper_key = ? WHERE row_id = ?", [(paper_key(id), row_id) for row_id, id in rows]
+            )
+            self.connection.commit()
+        self.connection.execute("CREATE INDEX IF NOT EXISTS metadata_paper_key ON metadata (paper_key)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS metadata_updated ON metadata (updated)")
+        # How the index next to the store was built, see FaissVectorDatabase.load
+        self.connection.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT)")
+
+    def __getitem__(self, row_id: int) -> Dict[str, Any]:
+        row = self.connection.execute(
+            f"SELECT {', '.join(COLUMNS)}, extra FROM metadata WHERE row_id = ?", (int(row_id),)
+        ).fetchone()
+        if row is None:
+            raise KeyError(row_id)
+        return self._to_dict(row)
+
+    def __setitem__(self, row_id: int, metadata: Dict[str, Any]):
+        self.update([(row_id, metadata)])
+
+    def __delitem__(self, row_id: int):
+        self.delete([row_id])
+
+    def __contains__(self, row_id: int) -> bool:
+        return self.connection.execute(
+            "SELECT 1 FROM metadata WHERE row_id = ?", (int(row_id),)
+        ).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+
+    def get_many(self, row_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Fetch the metadata of several rows.
+
+        Args:
+            row_ids (List[int]): The FAISS row ids to fetch.
+
+        Returns:
+            Dict[int, Dict[str, Any]]: The metadata of each row id found in the store.
+        """
+        results = {}
+        # Stay below SQLite's limit on the number of bound parameters
+        for start in range(0, len(row_ids), 900):
+            chunk = [int(row_id) for row_id in row_ids[start:start + 900]]
+            rows = self.connection.execute(
+                f"SELECT row_id, {', '.join(COLUMNS)}, extra FROM metadata "
+                f"WHERE row_id IN ({', '.join('?' * len(chunk))})", chunk
+            )
+            results.update((row[0], self._to_dict(row[1:])) for row in rows)
+        return results
+
+    def update(self, items: Iterable[Tuple[int, Dict[str, Any]]]):
+        """
+        Insert or replace the metadata of several rows in one statement.
+
+        Args:
+            items (Iterable[Tuple[int, Dict[str, Any]]]): Pairs of FAISS row id and metadata.
+        """
+        self.connection.executemany(
+            f"INSERT OR REPLACE INTO metadata (row_id, {', '.join(COLUMNS)}, extra, paper_key) "
+            f"VALUES ({', '.join('?' * (len(COLUMNS) + 3))})",
+            (self._to_row(row_id, metadata) for row_id, metadata in items)
+        )
+
+    def find_paper_keys(self, keys: List[str]) -> Dict[str, int]:
+        """
+        Find the rows holding any version of the given papers.
+
+        Args:
+            keys (List[str]): Paper keys, as returned by paper_key.
+
+        Returns:
+            Dict[str, int]: The row id of each paper key found in the store.
+        """
+        results = {}
+        for start in range(0, len(keys), 900):
+            chunk = keys[start:start + 900]
+            rows = self.connection.execute(
+                f"SELECT paper_key, row_id FROM metadata WHERE paper_key IN ({', '.join('?' * len(chunk))})", chunk
+            )
+            results.update(rows)
+        return results
+
+    def row_ids_updated_before(self, cutoff: str) -> List[int]:
+        """
+        Get the row ids of every entry whose 'updated' timestamp is older than the cutoff.
+
+        Args:
+            cutoff (str): An ISO formatted timestamp.
+
+        Returns:
+            List[int]: The matching row ids.
+        """
+        rows = self.connection.execute("SELECT row_id FROM metadata WHERE updated < ?", (cutoff,))
+        return [row[0] for row in rows]
+
+    def source_and_day(self) -> Iterator[Tuple[int, str, str]]:
+        """
+        Iterate over the (row id, source, YYYY-MM-DD day of 'updated') of every row.
+        """
+        yield from self.connection.execute("SELECT row_id, source, substr(updated, 1, 10) FROM metadata")
+
+    def next_row_id(self) -> int:
+        """
+        The smallest row id above every row in the store.
+        """
+        max_row_id = self.connection.execute("SELECT MAX(row_id) FROM metadata").fetchone()[0]
+        return 0 if max_row_id is None else max_row_id + 1
+
+    def get_setting(self, name: str, default: Any = None) -> Any:
+        """
+        Get a setting stored with set_setting, or the default if it was never set.
+        """
+        try:
+            row = self.connection.execute("SELECT value FROM settings WHERE name = ?", (name,)).fetchone()
+        except sqlite3.OperationalError:
+            # A read-only store created before settings existed
+            return default
+        return default if row is None else json.loads(row[0])
+
+    def set_setting(self, name: str, value: Any):
+        """
+        Store a JSON serializable setting, written with the next commit.
+        """
+        self.connection.execute("INSERT OR REPLACE INTO settings VALUES (?, ?)", (name, json.dumps(value)))
+
+    def delete(self, row_ids: Iterable[int]):
+        """
+        Remove the metadata of several rows.
+
+        Args:
+            row_ids (Iterable[int]): The FAISS row ids to remove.
+        """
+        self.connection.executemany("DELETE FROM metadata WHERE row_id = ?", ((int(row_id),) for row_id in row_ids))
+
+    def items(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Iterate over every (row id, metadata) pair in row id order, one row at a time.
+        """
+        rows = self.connection.execute(f"SELECT row_id, {', '.join(COLUMNS)}, extra FROM metadata ORDER BY row_id")
+        for row in rows:
+            yield row[0], self._to_dict(row[1:])
+
+    def clear(self):
+        self.connection.execute("DELETE FROM metadata")
+
+    def commit(self):
+        if not self.read_only:
+            self.connection.commit()
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    @staticmethod
+    def _to_row(row_id: int, metadata: Dict[str, Any]) -> Tuple:
+        extra = {key: value for key, value in metadata.items() if key not in COLUMNS}
+        return (int(row_id), *(metadata.get(column) for column in COLUMNS), json.dumps(extra) if extra else None,
+                paper_key(metadata['id']) if metadata.get('id') else None)
+
+    @staticmethod
+    def _to_dict(row: Tuple) -> Dict[str, Any]:
+        metadata = {column: value for column, value in zip(COLUMNS, row) if value is not None}
+        if row[-1] is not None:
+            metadata.update(json.loads(row[-1]))
+        return metadata
+
+
+def metadata_store_path(metadata_file: str) -> str:
+    """
+    The SQLite path used for a metadata file, so configs still naming a '.pkl' keep working.
+    """
+    root, extension = os.path.splitext(metadata_file)
+    return root + '.sqlite' if extension == '.pkl' else metadata_file
+
+
+def migrate_from_pickle(pickle_file: str, store_file: Optional[str] = None) -> MetadataStore:
+    """
+    Copy a pickled id_to_metadata dict into a new MetadataStore.
+
+    Args:
+        pickle_file (str): The path of the pickled {row id: metadata} dict.
+        store_file (str): The path of the SQLite store. Defaults to the pickle path with a '.sqlite' extension.
+
+    Returns:
+        MetadataStore: The store holding the migrated metadata.
+    """
+    store_file = store_file or metadata_store_path(pickle_file)
+    with open(pickle_file, 'rb') as f:
+        id_to_metadata = pickle.load(f)
+    store = MetadataStore(store_file)
+    store.clear()
+    store.update(id_to_metadata.items())
+    store.commit()
+    print(f"Migrated {len(id_to_metadata)} metadata entries from {pickle_file} to {store_file}")
+    return store
+
+
+def main():
+    # Usage: python -m app.database_management.vector_database.metadata_store data/*.pkl
+    for pickle_file in sys.argv[1:]:
+        migrate_from_pickle(pickle_file).close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
 from abc import ABC, abstractmethod
 import numpy as np
-from typing import List, Dict, Any
+from datetime import datetime
+from typing import List, Dict, Any, Optional
 import os
-import pickle
 import faiss
+from app.database_management.vector_database.metadata_store import (
+    MetadataStore, metadata_store_path, migrate_from_pickle, paper_key
+)
 
 class VectorDatabase(ABC):
     @abstractmethod
@@ -11,9 +14,55 @@ class VectorDatabase(ABC):
         pass
 
     @abstractmethod
-    def search(self, query_vector: np.ndarray, top_k: int = 10) -> List[Dict[str, Any]]:
+    def add_vectors(self, ids: List[str], vectors: np.ndarray, metadatas: List[Dict[str, Any]]):
         pass
 
+    @abstractmethod
+    def search(self, query_vector: np.ndarray, top_k: int = 10, sources: Optional[List[str]] = None,
+               start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def search_batch(self, query_vectors: np.ndarray, top_k: int = 10, sources: Optional[List[str]] = None,
+                     start_date: Optional[datetime] = None,
+                     end_date: Optional[datetime] = None) -> List[List[Dict[str, Any]]]:
+        pass
+
+# FAISS index_factory descriptions of the supported index types
+INDEX_FACTORIES = {
+    'flat': 'Flat',
+    'ivf_flat': 'IVF{nlist},Flat',
+    'ivf_pq': 'IVF{nlist},PQ{m}x{nbits}',
+    'hnsw': 'HNSW{M}',
+}
+
+DEFAULT_INDEX_PARAMS = {'nlist': 1024, 'm': 64, 'nbits': 8, 'M': 32}
+
+
+def build_index(dimension: int, index_type: str = 'flat', index_params: Optional[Dict[str, Any]] = None,
+                stable_ids: bool = False) -> faiss.Index:
+    """
+    Build an empty FAISS index of the given type.
+
+    Args:
+        dimension (int): The dimensionality of the vectors.
+        index_type (str): One of 'flat', 'ivf_flat', 'ivf_pq' or 'hnsw'.
+        index_params (Optional[Dict[str, Any]]): Overrides for nlist, m, nbits or M.
+        stable_ids (bool): Whether vectors are added with explicit ids that survive removals.
+            IVF indexes support this natively, the others are wrapped in an IDMap2.
+
+    Returns:
+        faiss.Index: The index, which may still need training.
+    """
+    if index_type not in INDEX_FACTORIES:
+        raise ValueError(f"Unsupported index type: {index_type}")
+    params = {**DEFAULT_INDEX_PARAMS, **(index_params or {})}
+    description = INDEX_FACTORIES[index_type].format(**params)
+    if stable_ids and not index_type.startswith('ivf'):
+        description = 'IDMap2,' + description
+    return faiss.index_factory(dimension, description, faiss.METRIC_L2)
+
+
 class FaissVectorDatabase(VectorDatabase):
     """
     A vector database implementation using FAISS for efficient similarity search.
@@ -22,24 +71,65 @@ class FaissVectorDatabase(VectorDatabase):
     and save/load the database to/from disk.
     """
 
-    def __init__(self, dimension: int, index_file: str = 'faiss_index.bin', metadata_file: str = 'metadata.pkl'):
+    def __init__(self, dimension: int, index_file: str = 'faiss_index.bin', metadata_file: str = 'metadata.pkl',
+                 index_type: str = 'flat', index_params: Optional[Dict[str, Any]] = None,
+                 search_params: Optional[Dict[str, Any]] = None, stable_ids: Optional[bool] = None,
+                 mmap: bool = False):
         """
         Initialize the FaissVectorDatabase.
 
         Args:
             dimension (int): The dimensionality of the vectors.
             index_file (str): The file path to save/load the FAISS index.
-            metadata_file (str): The file path to save/load the metadata.
+            metadata_file (str): The file path of the SQLite metadata store. A '.pkl' path is
+                read from the SQLite file next to it, migrated from the pickle on first load.
+            index_type (str): The index built when no index exists on disk, one of 'flat'
+                (exact search), 'ivf_flat', 'ivf_pq' or 'hnsw'. An existing index keeps the type
+                it was built with. Defaults to 'flat'.
+            index_params (Optional[Dict[str, Any]]): Build parameters (nlist, m, nbits, M) and
+                'train_size', the number of vectors gathered before training an IVF index. An
+                existing index keeps the parameters it was built with.
+            search_params (Optional[Dict[str, Any]]): Search-time knobs such as nprobe or efSearch.
+            stable_ids (bool): Keep one long-lived index where every paper has a stable row id.
+                Adding a new version of a paper replaces the old one in place, and old entries
+                can be dropped with evict_older_than. FAISS cannot remove vectors from an HNSW
+                graph, so use 'flat' or an IVF index type. An existing index keeps the mode it was
+                built with and raises if another one is asked for. Defaults to None, which is the
+                mode of the existing index, or append-only row ids for a new one.
+            mmap (bool): Open an existing index read-only and memory-mapped instead of reading it
+                into RAM, so short-lived processes start fast and share the page cache. Defaults to False.
         """
         self.dimension = dimension
         self.index_file = index_file
         self.metadata_file = metadata_file
-        
-        if os.path.exists(self.index_file) and os.path.exists(self.metadata_file):
+        self.metadata_path = metadata_store_path(metadata_file)
+        self.index_type = index_type
+        self.index_params = index_params or {}
+        self.search_params = search_params or {}
+        if index_type == 'hnsw' and stable_ids:
+            raise ValueError("FAISS cannot remove vectors from an HNSW index, stable_ids needs 'flat' or an IVF index type")
+        self.stable_ids = stable_ids
+        self.mmap = mmap
+        # Row ids per source and per day of 'updated', built on the first filtered search
+        self._filter_index = None
+        # (vectors, row ids) received before an untrained index has enough data to be trained
+        self._untrained_vectors = []
+        # Whether an exact flat index stands in for an IVF index trained on too few vectors
+        self.flat_fallback = False
+
+        if os.path.exists(self.index_file) and (os.path.exists(self.metadata_path) or os.path.exists(self.metadata_file)):
             self.load()
+        elif mmap:
+            raise FileNotFoundError(f"No index to memory-map at {self.index_file}")
         else:
-            self.index = faiss.IndexFlatL2(dimension)
-            self.id_to_metadata = {}
+            self.stable_ids = bool(stable_ids)
+            self.index = build_index(dimension, index_type, self.index_params, self.stable_ids)
+            self.id_to_metadata = MetadataStore(self.metadata_path)
+            self.id_to_metadata.clear()
+            self.id_to_metadata.set_setting('index_type', index_type)
+            self.id_to_metadata.set_setting('index_params', self.index_params)
+            self.id_to_metadata.set_setting('stable_ids', self.stable_ids)
+            self.set_search_params(**self.search_params)
 
     def add_vector(self, id: str, vector: np.ndarray, metadata: Dict[str, Any]):
         """
@@ -52,44 +142,329 @@ class FaissVectorDatabase(VectorDatabase):
         """
         if vector.shape[0] != self.dimension:
             raise ValueError(f"Vector dimension {vector.shape[0]} does not match index dimension {self.dimension}")
-        self.index.add(vector.reshape(1, -1))
-        self.id_to_metadata[self.index.ntotal - 1] = {"id": id, **metadata}
+        self.add_vectors([id], vector.reshape(1, -1), [metadata])
 
-    def search(self, query_vector: np.ndarray, top_k: int = 10) -> List[Dict[str, Any]]:
+    def add_vectors(self, ids: List[str], vectors: np.ndarray, metadatas: List[Dict[str, Any]]):
+        """
+        Add several vectors to the database with a single FAISS call.
+
+        Args:
+            ids (List[str]): The unique identifiers of the vectors.
+            vectors (np.ndarray): The vectors to be added, one per row.
+            metadatas (List[Dict[str, Any]]): Additional information about each vector.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dimension:
+            raise ValueError(f"Vector dimension {vectors.shape[-1]} does not match index dimension {self.dimension}")
+        if not len(ids) == len(metadatas) == vectors.shape[0]:
+            raise ValueError(f"Got {vectors.shape[0]} vectors for {len(ids)} ids and {len(metadatas)} metadata entries")
+        self._check_writable()
+        self._filter_index = None
+        if self.stable_ids:
+            self._upsert_vectors(ids, vectors, metadatas)
+            return
+        start = len(self)
+        self._add_with_ids(vectors, np.arange(start, start + len(ids), dtype=np.int64))
+        self.id_to_metadata.update(
+            (start + i, {"id": id, **metadata}) for i, (id, metadata) in enumerate(zip(ids, metadatas))
+        )
+
+    def _upsert_vectors(self, ids: List[str], vectors: np.ndarray, metadatas: List[Dict[str, Any]]):
+        # Only the last version of a paper within the batch is kept
+        latest = {paper_key(id): i for i, id in enumerate(ids)}
+        rows = list(latest.values())
+        existing = self.id_to_metadata.find_paper_keys(list(latest))
+        next_row_id = max(self.id_to_metadata.next_row_id(), int(self.index.ntotal))
+        row_ids = []
+        for key in latest:
+            if key in existing:
+                row_ids.append(existing[key])
+            else:
+                row_ids.append(next_row_id)
+                next_row_id += 1
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+
+        # Re-versioned papers keep their row id, their old vector is swapped for the new one
+        replaced = [row_id for key, row_id in zip(latest, row_ids.tolist()) if key in existing]
+        if replaced:
+            self._remove_ids(np.asarray(replaced, dtype=np.int64))
+        self._add_with_ids(vectors[rows], row_ids)
+        self.id_to_metadata.update(
+            (row_id, {"id": ids[i], **metadatas[i]}) for row_id, i in zip(row_ids.tolist(), rows)
+        )
+
+    def _add_with_ids(self, vectors: np.ndarray, row_ids: np.ndarray):
+        if not self.index.is_trained:
+            # IVF indexes learn their coarse quantizer from the data, so the first
+            # vectors are held back until there are enough of them to train on
+            self._untrained_vectors.append((vectors, row_ids))
+            if sum(len(v) for v, _ in self._untrained_vectors) >= self.train_size:
+                self.train()
+            return
+        if self.stable_ids:
+            self.index.add_with_ids(vectors, row_ids)
+        else:
+            self.index.add(vectors)
+        if self.flat_fallback and self.index.ntotal >= max(self.train_size, self._min_train_size()):
+            self._train_from_flat()
+
+    def _remove_ids(self, row_ids: np.ndarray):
+        self._untrained_vectors = [
+            (vectors[keep], ids[keep])
+            for vectors, ids in self._untrained_vectors
+            for keep in [~np.isin(ids, row_ids)]
+        ]
+        if self.index.ntotal:
+            self.index.remove_ids(row_ids)
+
+    def evict_older_than(self, cutoff: datetime) -> int:
+        """
+        Remove every entry whose 'updated' timestamp is older than the cutoff.
+
+        Args:
+            cutoff (datetime): The oldest timestamp kept in the database.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        if not self.stable_ids:
+            raise ValueError("Evicting entries requires an index created with stable_ids=True")
+        self._check_writable()
+        self._filter_index = None
+        row_ids = self.id_to_metadata.row_ids_updated_before(cutoff.isoformat())
+        if row_ids:
+            self._remove_ids(np.asarray(row_ids, dtype=np.int64))
+            self.id_to_metadata.delete(row_ids)
+        return len(row_ids)
+
+    def _check_writable(self):
+        if self.mmap:
+            raise ValueError(f"{self.index_file} was opened read-only with mmap=True")
+
+    def train(self):
+        """
+        Train the index on the vectors held back so far and add them to it.
+
+        With fewer vectors than the clusters need to be trained on, an exact flat index is
+        used instead, and replaced by one of the configured type once it holds enough of them.
+        """
+        if self.index.is_trained or not self._untrained_vectors:
+            return
+        vectors = np.concatenate([v for v, _ in self._untrained_vectors])
+        row_ids = np.concatenate([ids for _, ids in self._untrained_vectors])
+        self._untrained_vectors = []
+        min_train_size = self._min_train_size()
+        if len(vectors) < min_train_size:
+            print(f"Only {len(vectors)} vectors to train {self.index_type} on, which needs {min_train_size}: "
+                  f"using a flat index until there are enough")
+            self.index = build_index(self.dimension, 'flat', None, self.stable_ids)
+            self._set_flat_fallback(True)
+        else:
+            print(f"Training {self.index_type} index on {len(vectors)} vectors")
+            self.index.train(vectors)
+        self._add_with_ids(vectors, row_ids)
+
+    @property
+    def train_size(self) -> int:
+        nlist = self.index_params.get('nlist', DEFAULT_INDEX_PARAMS['nlist'])
+        return self.index_params.get('train_size', 50 * nlist)
+
+    def _min_train_size(self) -> int:
+        # FAISS warns below 39 training points per centroid, the clusters are degenerate
+        params = {**DEFAULT_INDEX_PARAMS, **self.index_params}
+        if self.index_type == 'ivf_pq':
+            # Each product quantizer also has 2^nbits centroids to train
+            return 39 * max(params['nlist'], 2 ** params['nbits'])
+        if self.index_type == 'ivf_flat':
+            return 39 * params['nlist']
+        return 0
+
+    def _train_from_flat(self):
+        # Move the vectors of the stand-in flat index to a newly trained index of the configured type
+        index = faiss.downcast_index(self.index)
+        if self.stable_ids:
+            row_ids = faiss.vector_to_array(index.id_map)
+            vectors = faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)
+        else:
+            row_ids = np.arange(index.ntotal, dtype=np.int64)
+            vectors = index.reconstruct_n(0, index.ntotal)
+        self.index = build_index(self.dimension, self.index_type, self.index_params, self.stable_ids)
+        self._set_flat_fallback(False)
+        self._untrained_vectors = [(vectors, row_ids)]
+        self.train()
+        self.set_search_params(**self.search_params)
+
+    def _set_flat_fallback(self, flat_fallback: bool):
+        self.flat_fallback = flat_fallback
+        self.id_to_metadata.set_setting('flat_fallback', flat_fallback)
+
+    def set_search_params(self, **params):
+        """
+        Set search-time parameters of the index, e.g. nprobe for IVF or efSearch for HNSW.
+        """
+        self.search_params.update(params)
+        if self.flat_fallback:
+            # Exact search has no knobs, they apply once the configured index is trained
+            return
+        parameter_space = faiss.ParameterSpace()
+        for name, value in params.items():
+            parameter_space.set_index_parameter(self.index, name, value)
+
+    def search(self, query_vector: np.ndarray, top_k: int = 10, sources: Optional[List[str]] = None,
+               start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
         """
         Search for the top-k most similar vectors to the query vector.
 
         Args:
             query_vector (np.ndarray): The query vector.
             top_k (int): The number of results to return.
+            sources (Optional[List[str]]): Only return results from these sources, e.g. ['biorxiv'].
+            start_date (Optional[datetime]): Only return results updated on or after this day.
+            end_date (Optional[datetime]): Only return results updated on or before this day.
 
         Returns:
             List[Dict[str, Any]]: A list of dictionaries containing search results.
         """
-        distances, indices = self.index.search(query_vector.reshape(1, -1), top_k)
-        results = []
-        for i, idx in enumerate(indices[0]):
-            if idx != -1:  # -1 indicates no match found
-                result = self.id_to_metadata[idx].copy()
-                result["distance"] = float(distances[0][i])
-                results.append(result)
-        return results
+        return self.search_batch(query_vector.reshape(1, -1), top_k, sources, start_date, end_date)[0]
+
+    def search_batch(self, query_vectors: np.ndarray, top_k: int = 10, sources: Optional[List[str]] = None,
+                     start_date: Optional[datetime] = None,
+                     end_date: Optional[datetime] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search for the top-k most similar vectors of several queries with a single FAISS call.
+
+        Filters are applied inside the FAISS scan through an ID selector, so rows that do
+        not match are skipped instead of being ranked and discarded afterwards.
+
+        Args:
+            query_vectors (np.ndarray): The query vectors, one per row.
+            top_k (int): The number of results to return for each query.
+            sources (Optional[List[str]]): Only return results from these sources, e.g. ['biorxiv'].
+            start_date (Optional[datetime]): Only return results updated on or after this day.
+            end_date (Optional[datetime]): Only return results updated on or before this day.
+
+        Returns:
+            List[List[Dict[str, Any]]]: The search results of each query, in the order of the rows.
+        """
+        self.train()
+        query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32)
+        if sources is None and start_date is None and end_date is None:
+            distances, indices = self.index.search(query_vectors, top_k)
+        else:
+            allowed = self._filtered_row_ids(sources, start_date, end_date)
+            if len(allowed) == 0:
+                return [[] for _ in range(len(query_vectors))]
+            # The bitmap has one bit per row id, little-endian within each byte,
+            # and FAISS takes its length in bytes
+            bitmap = np.zeros(int(allowed.max()) + 1, dtype=bool)
+            bitmap[allowed] = True
+            packed = np.packbits(bitmap, bitorder='little')
+            selector = faiss.IDSelectorBitmap(len(packed), faiss.swig_ptr(packed))
+            distances, indices = self.index.search(query_vectors, top_k, params=self._search_parameters(selector))
+        # Look every distinct hit up once, however many queries share it
+        found = indices != -1  # -1 indicates no match found
+        metadata = self.id_to_metadata.get_many(np.unique(indices[found]).tolist())
+        # A reader still on the previous index can hit rows whose metadata was just deleted
+        return [
+            [{**metadata[idx], "distance": distance}
+             for idx, distance in zip(row_indices[row_found].tolist(), row_distances[row_found].tolist())
+             if idx in metadata]
+            for row_indices, row_distances, row_found in zip(indices, distances, found)
+        ]
+
+    def _filtered_row_ids(self, sources: Optional[List[str]], start_date: Optional[datetime],
+                          end_date: Optional[datetime]) -> np.ndarray:
+        if self._filter_index is None:
+            self._build_filter_index()
+        by_source, by_day = self._filter_index
+
+        allowed = None
+        if sources is not None:
+            allowed = np.concatenate([by_source.get(source, np.empty(0, dtype=np.int64)) for source in sources] or
+                                     [np.empty(0, dtype=np.int64)])
+        if start_date is not None or end_date is not None:
+            first_day = start_date.strftime('%Y-%m-%d') if start_date else ''
+            last_day = end_date.strftime('%Y-%m-%d') if end_date else '9999-12-31'
+            in_range = [row_ids for day, row_ids in by_day.items() if first_day <= day <= last_day]
+            in_range = np.concatenate(in_range) if in_range else np.empty(0, dtype=np.int64)
+            allowed = in_range if allowed is None else np.intersect1d(allowed, in_range, assume_unique=True)
+        return allowed
+
+    def _build_filter_index(self):
+        by_source, by_day = {}, {}
+        for row_id, source, day in self.id_to_metadata.source_and_day():
+            by_source.setdefault(source, []).append(row_id)
+            by_day.setdefault(day or '', []).append(row_id)
+        self._filter_index = (
+            {source: np.asarray(row_ids, dtype=np.int64) for source, row_ids in by_source.items()},
+            {day: np.asarray(row_ids, dtype=np.int64) for day, row_ids in by_day.items()},
+        )
+
+    def _search_parameters(self, selector: faiss.IDSelector) -> faiss.SearchParameters:
+        # Search parameters replace the index defaults, so the configured knobs are carried over
+        index = faiss.downcast_index(self.index)
+        if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+            index = faiss.downcast_index(index.index)
+        if isinstance(index, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+        if isinstance(index, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+        return faiss.SearchParameters(sel=selector)
 
     def save(self):
         """
         Save the FAISS index and metadata to disk.
+
+        Readers may have the index file memory-mapped, so it is never rewritten in place: the
+        index is written next to it, the metadata committed, then the new file renamed over
+        the old one, which stays valid for the readers still mapping it.
         """
-        faiss.write_index(self.index, self.index_file)
-        with open(self.metadata_file, 'wb') as f:
-            pickle.dump(self.id_to_metadata, f)
+        self._check_writable()
+        self.train()
+        tmp_file = self.index_file + '.tmp'
+        faiss.write_index(self.index, tmp_file)
+        self.id_to_metadata.commit()
+        os.replace(tmp_file, self.index_file)
 
     def load(self):
         """
         Load the FAISS index and metadata from disk.
         """
-        self.index = faiss.read_index(self.index_file)
-        with open(self.metadata_file, 'rb') as f:
-            self.id_to_metadata = pickle.load(f)
+        if os.path.exists(self.metadata_path):
+            self.id_to_metadata = MetadataStore(self.metadata_path, read_only=self.mmap)
+        else:
+            # One-shot migration of a legacy pickled metadata dict
+            self.id_to_metadata = migrate_from_pickle(self.metadata_file, self.metadata_path)
+        self.index_type = self.id_to_metadata.get_setting('index_type', self.index_type)
+        self.index_params = self.id_to_metadata.get_setting('index_params', self.index_params)
+        self.flat_fallback = self.id_to_metadata.get_setting('flat_fallback', False)
+        if self.mmap:
+            self.index = faiss.read_index(self.index_file, self._mmap_flags())
+        else:
+            self.index = faiss.read_index(self.index_file)
+
+        # The row id scheme is a property of the stored index: positional ids taken from ntotal
+        # would collide with the stable ids of an IVF index after an eviction or a replacement
+        stored_stable_ids = self.id_to_metadata.get_setting('stable_ids')
+        if stored_stable_ids is None:
+            # Saved before the settings were stored, IDMap wrapping is the only trace of the mode
+            stored_stable_ids = isinstance(self.index, (faiss.IndexIDMap, faiss.IndexIDMap2)) or bool(self.stable_ids)
+            if not self.mmap:
+                self.id_to_metadata.set_setting('index_type', self.index_type)
+                self.id_to_metadata.set_setting('index_params', self.index_params)
+                self.id_to_metadata.set_setting('stable_ids', stored_stable_ids)
+        if self.stable_ids is not None and self.stable_ids != stored_stable_ids:
+            raise ValueError(f"{self.index_file} was built with stable_ids={stored_stable_ids}, "
+                             f"it cannot be opened with stable_ids={self.stable_ids}")
+        self.stable_ids = stored_stable_ids
+        self.set_search_params(**self.search_params)
+
+    def _mmap_flags(self) -> int:
+        # IVF inverted lists are mapped by IO_FLAG_MMAP, flat codes (also behind IDMap2
+        # and HNSW) by IO_FLAG_MMAP_IFC on FAISS >= 1.9. The two cannot be combined.
+        if (self.index_type.startswith('ivf') and not self.flat_fallback) or not hasattr(faiss, 'IO_FLAG_MMAP_IFC'):
+            return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        return faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
 
     def __len__(self):
         """
@@ -98,4 +473,4 @@ class FaissVectorDatabase(VectorDatabase):
         Returns:
             int: The total number of vectors in the database.
         """
-        return self.index.ntotal
+        return self.index.ntotal + sum(len(v) for v, _ in self._untrained_vectors)
@@ -0,0 +1,57 @@
+"""
+Compare tokens/sec of the fixed 512-token BertVectorizer path against the
+length-bucketed dynamic padding mode, over the abstracts of a weekly JSON file.
+
+Only real (non padding) tokens are counted, so both modes are measured on the
+same amount of useful work.
+"""
+
+import argparse
+import json
+import time
+from typing import List
+from app.database_management.vectorizer.bert import BertVectorizer
+
+
+def load_abstracts(json_file_path: str, limit: int) -> List[str]:
+    with open(json_file_path, 'r') as file:
+        data = json.load(file)
+    abstracts = [article['abstract'] for articles in data.values() for article in articles]
+    return abstracts[:limit]
+
+
+def benchmark(vectorizer: BertVectorizer, abstracts: List[str], batch_size: int) -> float:
+    real_tokens = sum(
+        len(ids) for ids in vectorizer.tokenizer(abstracts, max_length=512, truncation=True)['input_ids']
+    )
+    # The bucketed mode sorts and batches internally, so it gets the whole corpus at once
+    chunk_size = len(abstracts) if vectorizer.dynamic_padding else batch_size
+    start = time.perf_counter()
+    for i in range(0, len(abstracts), chunk_size):
+        vectorizer.vectorize_batch(abstracts[i:i + chunk_size])
+    elapsed = time.perf_counter() - start
+    return real_tokens / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('json_file', help="weekly articles JSON, as written by weekly_fetcher")
+    parser.add_argument('--model', default='BAAI/bge-base-en-v1.5')
+    parser.add_argument('--limit', type=int, default=512, help="number of abstracts to embed")
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    abstracts = load_abstracts(args.json_file, args.limit)
+    print(f"Embedding {len(abstracts)} abstracts with {args.model}")
+
+    fixed = BertVectorizer(model_name=args.model, batch_size=args.batch_size)
+    fixed_rate = benchmark(fixed, abstracts, args.batch_size)
+    print(f"max_length padding: {fixed_rate:,.0f} tokens/sec")
+
+    bucketed = BertVectorizer(model_name=args.model, dynamic_padding=True, batch_size=args.batch_size)
+    bucketed_rate = benchmark(bucketed, abstracts, args.batch_size)
+    print(f"dynamic padding:    {bucketed_rate:,.0f} tokens/sec ({bucketed_rate / fixed_rate:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,81 @@
 from transformers import BertTokenizer, BertModel
 import torch
+from typing import List
 from app.database_management.vectorizer.vectorizer_interface import IVectorizer
 import numpy as np
 from sentence_transformers import SentenceTransformer
 
 class BertVectorizer(IVectorizer):
-    def __init__(self, model_name='bert-base-uncased'):
+    def __init__(self, model_name='bert-base-uncased', dynamic_padding: bool = False, batch_size: int = 32):
+        self.model_name = model_name
         self.tokenizer = BertTokenizer.from_pretrained(model_name)
         self.model = BertModel.from_pretrained(model_name)
         self.model.eval()
+        # With dynamic padding, inputs are sorted into length buckets, each batch is
+        # padded only to its longest member and pooling ignores the padding. Vectors
+        # differ from the fixed 512-token path, so an index must be built with one mode.
+        self.dynamic_padding = dynamic_padding
+        self.batch_size = batch_size
+
+    @property
+    def cache_name(self) -> str:
+        return f"{self.model_name}-dynamic" if self.dynamic_padding else self.model_name
 
     def vectorize_text(self, text: str) -> np.ndarray:
+        if self.dynamic_padding:
+            return self.vectorize_batch([text])[0]
         inputs = self.tokenizer(text, return_tensors='pt', max_length=512, truncation=True, padding='max_length')
         with torch.no_grad():
             outputs = self.model(**inputs)
         return outputs.last_hidden_state.mean(dim=1).squeeze().numpy()
 
+    def vectorize_batch(self, texts: List[str]) -> np.ndarray:
+        if self.dynamic_padding:
+            return self._vectorize_bucketed(list(texts))
+        # One forward pass per batch_size texts instead of one per text, every text padded to 512
+        texts = list(texts)
+        vectors = np.zeros((len(texts), self.model.config.hidden_size), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            inputs = self.tokenizer(texts[start:start + self.batch_size], return_tensors='pt', max_length=512,
+                                    truncation=True, padding='max_length')
+            with torch.no_grad():
+                outputs = self.model(**inputs)
+            vectors[start:start + self.batch_size] = outputs.last_hidden_state.mean(dim=1).numpy()
+        return vectors
+
+    def _vectorize_bucketed(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer(texts, max_length=512, truncation=True)['input_ids']
+        # Sorting by length keeps similarly sized texts together, so each batch
+        # pads to a length close to that of all its members
+        order = sorted(range(len(texts)), key=lambda i: len(encodings[i]))
+        vectors = np.zeros((len(texts), self.model.config.hidden_size), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            bucket = order[start:start + self.batch_size]
+            inputs = self.tokenizer.pad({'input_ids': [encodings[i] for i in bucket]}, return_tensors='pt')
+            with torch.no_grad():
+                outputs = self.model(**inputs)
+            mask = inputs['attention_mask'].unsqueeze(-1).to(outputs.last_hidden_state.dtype)
+            pooled = (outputs.last_hidden_state * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+            vectors[bucket] = pooled.numpy()
+        return vectors
+
 
 class HuggingFaceVectorizer(IVectorizer):
     def __init__(self, model_name: str = 'paraphrase-MiniLM-L6-v2'):
         # Load pre-trained SBERT model
+        self.model_name = model_name
         self.model = SentenceTransformer(model_name)
 
+    @property
+    def cache_name(self) -> str:
+        return self.model_name
+
     def vectorize_text(self, text: str) -> np.ndarray:
         # Use the SBERT model to generate a vector representation of the input text
         embedding = self.model.encode(text)
-        return np.array(embedding)
\ No newline at end of file
+        return np.array(embedding)
+
+    def vectorize_batch(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        # SentenceTransformer batches internally, we just hand it the whole chunk
+        embeddings = self.model.encode(list(texts), batch_size=batch_size)
+        return np.asarray(embeddings)
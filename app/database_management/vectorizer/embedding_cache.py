@@ -0,0 +1,189 @@
+import hashlib
+import os
+import pickle
+import re
+from typing import List, Tuple
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    A persistent, content-addressed cache of text embeddings.
+
+    Vectors are keyed by (model name, SHA-256 of the text) and stored in a fixed
+    capacity float32 ``.npy`` file that is opened as a memory map, so only the rows
+    that are actually read or written are paged in. When the cache is full the least
+    recently used entries are evicted to make room for new ones.
+
+    The hash of each slot's text is stored next to its vector and checked on lookup, so
+    a key index older than the vectors (after a crash between put and save) cannot
+    return the vector of another text for a slot that was evicted and reused.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, dimension: int, max_entries: int = 200_000):
+        """
+        Initialize the EmbeddingCache.
+
+        Args:
+            cache_dir (str): The directory holding the caches of every model.
+            model_name (str): The name of the model and settings producing the vectors, see
+                IVectorizer.cache_name. Each name gets its own cache.
+            dimension (int): The dimensionality of the vectors.
+            max_entries (int): The maximum number of vectors kept before evicting. Defaults to 200,000.
+        """
+        self.model_name = model_name
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.directory = os.path.join(cache_dir, re.sub(r'[^\w.-]', '_', model_name))
+        self.vectors_file = os.path.join(self.directory, 'vectors.npy')
+        self.hashes_file = os.path.join(self.directory, 'hashes.npy')
+        self.index_file = os.path.join(self.directory, 'index.pkl')
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        if all(os.path.exists(path) for path in (self.vectors_file, self.hashes_file, self.index_file)):
+            self.load()
+        else:
+            self._reset()
+
+    def lookup(self, texts: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """
+        Look up the vectors of several texts.
+
+        Args:
+            texts (List[str]): The texts to look up.
+
+        Returns:
+            Tuple[np.ndarray, List[int]]: A matrix with one row per text, filled for the
+                texts found in the cache, and the positions of the texts that were not found.
+        """
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        found_rows, found_slots, found_keys, missing = [], [], [], []
+        for i, text in enumerate(texts):
+            key = self._key(text)
+            slot = self.key_to_slot.get(key)
+            if slot is None:
+                missing.append(i)
+            else:
+                found_rows.append(i)
+                found_slots.append(slot)
+                found_keys.append(key)
+
+        if found_slots:
+            # A slot holding another text's hash was reused after the index was saved
+            stale = np.flatnonzero(np.any(self.hashes[found_slots] != self._hashes(found_keys), axis=1))
+            for position in stale[::-1].tolist():
+                self._forget(found_slots[position])
+                missing.append(found_rows.pop(position))
+                del found_slots[position]
+            missing.sort()
+
+        if found_slots:
+            vectors[found_rows] = self.vectors[found_slots]
+            self._touch(found_slots)
+        self.hits += len(found_slots)
+        self.misses += len(missing)
+        return vectors, missing
+
+    def put(self, texts: List[str], vectors: np.ndarray):
+        """
+        Store the vectors of several texts, evicting the least recently used entries if needed.
+
+        Args:
+            texts (List[str]): The texts that were vectorized.
+            vectors (np.ndarray): The matrix of their vectors, one row per text.
+        """
+        new_entries = {}
+        for text, vector in zip(texts, vectors):
+            key = self._key(text)
+            if key not in self.key_to_slot:
+                new_entries[key] = vector
+        if not new_entries:
+            return
+
+        # A batch larger than the whole cache only keeps its last rows
+        keys = list(new_entries)[-self.max_entries:]
+        self._evict(len(keys) - len(self.free_slots))
+        slots = [self.free_slots.pop() for _ in keys]
+        # Clear the hashes first so a crash midway leaves the slots unreadable rather than mismatched
+        self.hashes[slots] = 0
+        self.vectors[slots] = np.asarray([new_entries[key] for key in keys], dtype=np.float32)
+        self.hashes[slots] = self._hashes(keys)
+        for key, slot in zip(keys, slots):
+            self.slot_keys[slot] = key
+            self.key_to_slot[key] = slot
+        self._touch(slots)
+
+    def save(self):
+        """
+        Flush the vectors and their hashes to disk and atomically rewrite the key index.
+        """
+        self.vectors.flush()
+        self.hashes.flush()
+        tmp_file = self.index_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            pickle.dump({'slot_keys': self.slot_keys, 'ticks': self.ticks, 'clock': self.clock}, f)
+        os.replace(tmp_file, self.index_file)
+
+    def load(self):
+        """
+        Open the vectors and their hashes as memory maps and load the key index from disk.
+        """
+        vectors = np.load(self.vectors_file, mmap_mode='r+')
+        hashes = np.load(self.hashes_file, mmap_mode='r+')
+        if vectors.shape != (self.max_entries, self.dimension) or hashes.shape != (self.max_entries, 32):
+            # The cache was created with another capacity or dimension, start over
+            del vectors, hashes
+            self._reset()
+            return
+        self.vectors = vectors
+        self.hashes = hashes
+        with open(self.index_file, 'rb') as f:
+            index = pickle.load(f)
+        self.slot_keys = index['slot_keys']
+        self.ticks = index['ticks']
+        self.clock = index['clock']
+        self.key_to_slot = {key: slot for slot, key in enumerate(self.slot_keys) if key is not None}
+        self.free_slots = [slot for slot, key in enumerate(self.slot_keys) if key is None]
+
+    def _reset(self):
+        self.vectors = np.lib.format.open_memmap(
+            self.vectors_file, mode='w+', dtype=np.float32, shape=(self.max_entries, self.dimension))
+        self.hashes = np.lib.format.open_memmap(
+            self.hashes_file, mode='w+', dtype=np.uint8, shape=(self.max_entries, 32))
+        self.slot_keys = [None] * self.max_entries
+        self.ticks = np.zeros(self.max_entries, dtype=np.int64)
+        self.clock = 0
+        self.key_to_slot = {}
+        self.free_slots = list(range(self.max_entries - 1, -1, -1))
+
+    def _evict(self, count: int):
+        if count <= 0:
+            return
+        occupied = np.fromiter(self.key_to_slot.values(), dtype=np.int64, count=len(self.key_to_slot))
+        oldest = occupied[np.argpartition(self.ticks[occupied], count - 1)[:count]]
+        for slot in oldest.tolist():
+            self._forget(slot)
+
+    def _forget(self, slot: int):
+        if self.slot_keys[slot] is None:
+            return
+        del self.key_to_slot[self.slot_keys[slot]]
+        self.slot_keys[slot] = None
+        self.free_slots.append(slot)
+
+    def _touch(self, slots: List[int]):
+        self.clock += 1
+        self.ticks[slots] = self.clock
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _hashes(keys: List[str]) -> np.ndarray:
+        return np.frombuffer(b''.join(bytes.fromhex(key) for key in keys), dtype=np.uint8).reshape(len(keys), 32)
+
+    def __len__(self):
+        return len(self.key_to_slot)
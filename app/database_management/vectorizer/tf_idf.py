@@ -1,6 +1,7 @@
 from sklearn.feature_extraction.text import TfidfVectorizer
 from app.database_management.vectorizer.vectorizer_interface import IVectorizer
 import numpy as np
+from typing import List
 
 class TfidfVectorizerWrapper(IVectorizer):
     def __init__(self, max_features=5000):
@@ -15,3 +16,8 @@ class TfidfVectorizerWrapper(IVectorizer):
         if not self.is_fitted:
             raise ValueError("Vectorizer must be fitted before vectorizing text")
         return self.vectorizer.transform([text]).toarray()[0]
+
+    def vectorize_batch(self, texts: List[str]) -> np.ndarray:
+        if not self.is_fitted:
+            raise ValueError("Vectorizer must be fitted before vectorizing text")
+        return self.vectorizer.transform(list(texts)).toarray()
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import List, Optional
 import numpy as np
 
 # Vectorizer Interface
@@ -7,4 +8,18 @@ class IVectorizer(ABC):
     def vectorize_text(self, text: str) -> np.ndarray:
         pass
 
+    @abstractmethod
+    def vectorize_batch(self, texts: List[str]) -> np.ndarray:
+        """Vectorize several texts at once, returning one row per text."""
+        pass
+
+    @property
+    def cache_name(self) -> Optional[str]:
+        """Name the model and settings producing the vectors, used to keep an EmbeddingCache per name.
+
+        None, the default, means the vectors are not cached.
+        """
+        # Fitted vectorizers depend on their training texts and cannot share cached vectors
+        return None
+
 
@@ -2,6 +2,7 @@ from gensim.models import Word2Vec
 from gensim.utils import simple_preprocess
 from app.database_management.vectorizer.vectorizer_interface import IVectorizer
 import numpy as np
+from typing import List
 
 class Word2VecVectorizer(IVectorizer):
     def __init__(self, vector_size=100, window=5, min_count=1):
@@ -22,3 +23,25 @@ class Word2VecVectorizer(IVectorizer):
         if not word_vectors:
             return np.zeros(self.model.vector_size)
         return np.mean(word_vectors, axis=0)
+
+    def vectorize_batch(self, texts: List[str]) -> np.ndarray:
+        if not self.is_fitted:
+            raise ValueError("Vectorizer must be fitted before vectorizing text")
+        key_to_index = self.model.wv.key_to_index
+        # Flatten the in-vocabulary word indices of every text so the averaging
+        # happens in a single vectorized pass over the embedding matrix
+        indices = []
+        counts = np.zeros(len(texts), dtype=np.int64)
+        for i, text in enumerate(texts):
+            text_indices = [key_to_index[word] for word in simple_preprocess(text) if word in key_to_index]
+            indices.extend(text_indices)
+            counts[i] = len(text_indices)
+
+        vectors = np.zeros((len(texts), self.model.vector_size), dtype=self.model.wv.vectors.dtype)
+        non_empty = counts > 0
+        if indices:
+            word_vectors = self.model.wv.vectors[np.asarray(indices)]
+            offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            sums = np.add.reduceat(word_vectors, offsets[non_empty], axis=0)
+            vectors[non_empty] = sums / counts[non_empty, None]
+        return vectors
@@ -0,0 +1,37 @@
+"""
+Time the shared PDF text cleaner against the original per-strategy cleaner.
+
+Reports the MB/s of both cleaners on the same texts: those of an optional local corpus
+of PDFs, or generated paper-like texts. That both give the same output is checked by
+app/fetchers/test_text_cleaner.py.
+"""
+
+import argparse
+import time
+from typing import List
+from app.fetchers.text_cleaner import clean_text
+from app.fetchers.test_text_cleaner import corpus_texts, legacy_clean_text, paper_texts
+
+
+def throughput(cleaner, texts: List[str], repeat: int) -> float:
+    megabytes = sum(len(text.encode('utf-8')) for text in texts) * repeat / 1e6
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            cleaner(text)
+    return megabytes / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--corpus', default=None, help="directory of PDF files whose texts are timed")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    timed = corpus_texts(args.corpus) if args.corpus else paper_texts(100, 8000)
+    for name, cleaner in (('original', legacy_clean_text), ('shared', clean_text)):
+        print(f"{name:<10} {throughput(cleaner, timed, args.repeat):>8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
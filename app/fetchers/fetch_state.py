@@ -0,0 +1,148 @@
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union
+
+
+class FetchState:
+    """
+    Persisted per-source watermarks and pagination checkpoints for incremental fetching.
+
+    For every source we keep:
+        - a watermark: the latest 'updated' timestamp already written, together with the
+          ids written at exactly that timestamp, so the next run only keeps newer articles.
+        - a checkpoint of the run in progress: its date window and the cursor of the first
+          page not written yet. An interrupted run resumes there instead of starting over.
+
+    While a run is in progress we also keep its output file and the size that file had
+    at the last checkpoint. Both are saved together with the cursors, so a resumed run
+    writes to the same file and first drops whatever was written after the checkpoint.
+
+    The state is a small JSON file, rewritten atomically after every page.
+    """
+
+    def __init__(self, state_file: str):
+        """
+        Initialize the FetchState.
+
+        Args:
+            state_file (str): The JSON file holding the state, created on first save.
+        """
+        self.state_file = state_file
+        if os.path.exists(state_file):
+            with open(state_file, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+        else:
+            self.state = {}
+
+    def begin(self, source: str, default_start: datetime, end_date: datetime) -> Tuple[datetime, datetime, int]:
+        """
+        Decide the window and first cursor of a source's fetch, resuming an interrupted run if any.
+
+        Args:
+            source (str): The source name.
+            default_start (datetime): Where to start when the source has never been fetched.
+            end_date (datetime): The end of the window of a new run.
+
+        Returns:
+            Tuple[datetime, datetime, int]: The start date, end date and first cursor to fetch.
+        """
+        source_state = self.state.setdefault(source, {})
+        checkpoint = source_state.get('checkpoint')
+        if checkpoint is None:
+            watermark = source_state.get('watermark')
+            start_date = datetime.fromisoformat(watermark) if watermark else default_start
+            checkpoint = {
+                'start_date': start_date.isoformat(),
+                'end_date': end_date.isoformat(),
+                'next_cursor': 0,
+                'watermark': source_state.get('watermark'),
+                'watermark_ids': source_state.get('watermark_ids', []),
+            }
+            source_state['checkpoint'] = checkpoint
+            self.save()
+        else:
+            print(f"Resuming {source} from cursor {checkpoint['next_cursor']}")
+        return (datetime.fromisoformat(checkpoint['start_date']), datetime.fromisoformat(checkpoint['end_date']),
+                checkpoint['next_cursor'])
+
+    def output(self, default_file: str) -> Tuple[str, int]:
+        """
+        Get the output file of the run in progress, or start a run writing to the default file.
+
+        Args:
+            default_file (str): The file written when no run is in progress.
+
+        Returns:
+            Tuple[str, int]: The file to write and its size at the last checkpoint, which is
+                where the writing resumes.
+        """
+        if 'output' not in self.state:
+            # A file left by an earlier completed run is appended to
+            offset = os.path.getsize(default_file) if os.path.exists(default_file) else 0
+            self.state['output'] = {'file': default_file, 'offset': offset}
+            self.save()
+        return self.state['output']['file'], self.state['output']['offset']
+
+    def is_new(self, source: str, article: Dict[str, Union[str, datetime]]) -> bool:
+        """
+        Whether an article was not written by a previous run.
+        """
+        source_state = self.state.get(source, {})
+        watermark = source_state.get('watermark')
+        if watermark is None:
+            return True
+        updated = self._timestamp(article['updated'])
+        return updated > watermark or (updated == watermark and article['id'] not in source_state.get('watermark_ids', []))
+
+    def page_done(self, source: str, next_cursor: int, articles: List[Dict[str, Union[str, datetime]]],
+                  offset: Optional[int] = None):
+        """
+        Record that a page was written: advance the checkpoint and the pending watermark.
+
+        Args:
+            source (str): The source name.
+            next_cursor (int): The cursor of the page following the written one.
+            articles (List[Dict[str, Union[str, datetime]]]): The articles of the written page.
+            offset (Optional[int]): The size of the output file once the page is written.
+        """
+        if offset is not None:
+            self.state['output']['offset'] = offset
+        checkpoint = self.state[source]['checkpoint']
+        checkpoint['next_cursor'] = next_cursor
+        for article in articles:
+            updated = self._timestamp(article['updated'])
+            if checkpoint['watermark'] is None or updated > checkpoint['watermark']:
+                checkpoint['watermark'] = updated
+                checkpoint['watermark_ids'] = [article['id']]
+            elif updated == checkpoint['watermark'] and article['id'] not in checkpoint['watermark_ids']:
+                checkpoint['watermark_ids'].append(article['id'])
+        self.save()
+
+    def finish(self, source: str):
+        """
+        Close a source's run: its pending watermark becomes the watermark and the checkpoint is dropped.
+        """
+        source_state = self.state[source]
+        checkpoint = source_state.pop('checkpoint')
+        source_state['watermark'] = checkpoint['watermark']
+        source_state['watermark_ids'] = checkpoint['watermark_ids']
+        if not any(self.has_checkpoint(name) for name in self.state if name != 'output'):
+            # The next run starts a new file
+            self.state.pop('output', None)
+        self.save()
+
+    def has_checkpoint(self, source: str) -> bool:
+        return 'checkpoint' in self.state.get(source, {})
+
+    def save(self):
+        tmp_file = self.state_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_file, self.state_file)
+
+    @staticmethod
+    def _timestamp(updated: Union[str, datetime]) -> str:
+        # ISO strings of the same format compare in time order
+        return updated if isinstance(updated, str) else updated.isoformat()
+
@@ -1,21 +1,56 @@
 import feedparser
 import requests
+from requests.adapters import HTTPAdapter
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from datetime import datetime, timedelta
-from typing import List, Dict, Union
+from typing import List, Dict, Union, Optional, Iterator
 from abc import ABC, abstractmethod
 
+
+def create_session(max_connections: int) -> requests.Session:
+    """
+    A requests session keeping up to max_connections keep-alive connections per host.
+    Requests beyond that wait for a free connection instead of opening a new one.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections, pool_block=True)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
 class ArticleRetriever(ABC):
+    def __init__(self, base_url: Optional[str] = None, session: Optional[requests.Session] = None,
+                 max_concurrency: int = 1):
+        # base_url can point at a local stand-in server
+        self.base_url = base_url or self.BASE_URL
+        self.max_concurrency = max_concurrency
+        self.session = session or create_session(max_concurrency)
+
     @abstractmethod
-    def fetch_articles(self, start_date: datetime, end_date: datetime) -> List[Dict[str, Union[str, datetime]]]:
+    def iter_pages(self, start_date: datetime, end_date: datetime,
+                   start_cursor: int = 0) -> Iterator[List[Dict[str, Union[str, datetime]]]]:
+        # Yields the articles one API page of PAGE_SIZE results at a time, as soon as each
+        # page arrives. start_cursor skips the results before it, to resume a paginated fetch.
         pass
 
+    def fetch_articles(self, start_date: datetime, end_date: datetime) -> List[Dict[str, Union[str, datetime]]]:
+        articles = []
+        for page in self.iter_pages(start_date, end_date):
+            articles.extend(page)
+        return articles
+
 class ArXivRetriever(ArticleRetriever):
+    # arXiv asks API clients not to send parallel requests, so its pages stay serial
     BASE_URL = 'http://export.arxiv.org/api/query?'
+    PAGE_SIZE = 1000  # arXiv API allows up to 1000 results per request
 
-    def fetch_articles(self, start_date: datetime, end_date: datetime) -> List[Dict[str, Union[str, datetime]]]:
-        articles = []
-        start = 0
-        batch_size = 1000  # arXiv API allows up to 1000 results per request
+    def iter_pages(self, start_date: datetime, end_date: datetime,
+                   start_cursor: int = 0) -> Iterator[List[Dict[str, Union[str, datetime]]]]:
+        start = start_cursor
+        batch_size = self.PAGE_SIZE
 
         while True:
             params = {
@@ -25,9 +60,9 @@ class ArXivRetriever(ArticleRetriever):
                 'sortBy': 'lastUpdatedDate',
                 'sortOrder': 'ascending'
             }
-            url = self.BASE_URL + '&'.join([f'{k}={v}' for k, v in params.items()])
+            url = self.base_url + '&'.join([f'{k}={v}' for k, v in params.items()])
             
-            response = requests.get(url)
+            response = self.session.get(url)
             response.raise_for_status()
             
             feed = feedparser.parse(response.content)
@@ -43,52 +78,67 @@ class ArXivRetriever(ArticleRetriever):
                 for entry in feed.entries
             ]
             
-            articles.extend(batch_articles)
-            
+            yield batch_articles
             
             if len(batch_articles) < batch_size:
                 break
             
             start += batch_size
 
-        return articles
-
 class BioRxivRetriever(ArticleRetriever):
     BASE_URL = 'https://api.biorxiv.org/details/biorxiv/'
+    PAGE_SIZE = 100
 
-    def fetch_articles(self, start_date: datetime, end_date: datetime) -> List[Dict[str, Union[str, datetime]]]:
-        articles = []
-        cursor = 0
-        
-        while True:
-            url = f"{self.BASE_URL}{start_date.strftime('%Y-%m-%d')}/{end_date.strftime('%Y-%m-%d')}/{cursor}"
-            
-            response = requests.get(url)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            batch_articles = [
-                {
-                    'title': article['title'],
-                    'abstract': article['abstract'],
-                    'id': article['doi'],
-                    'pdf_url': f"https://www.biorxiv.org/content/{article['doi']}v{article['version']}.full.pdf",
-                    'updated': datetime.strptime(article['date'], '%Y-%m-%d')
-                }
-                for article in data['collection']
-            ]
-            
-            articles.extend(batch_articles)
-            
-            
-            total_count = int(data['messages'][0]['total'])
-            if len(batch_articles) < 100 or total_count <= cursor + len(batch_articles):
-                break
-            
-            cursor += 100
+    def __init__(self, base_url: Optional[str] = None, session: Optional[requests.Session] = None,
+                 max_concurrency: int = 4):
+        super().__init__(base_url, session, max_concurrency)
 
-        return articles
+    def iter_pages(self, start_date: datetime, end_date: datetime,
+                   start_cursor: int = 0) -> Iterator[List[Dict[str, Union[str, datetime]]]]:
+        # The first page tells us the total, then the remaining cursors are fetched in parallel
+        data = self._fetch_page(start_date, end_date, start_cursor)
+        first_page = self._parse_page(data)
+        yield first_page
+
+        total_count = int(data['messages'][0]['total'])
+        cursors = range(start_cursor + self.PAGE_SIZE, total_count, self.PAGE_SIZE)
+        if len(first_page) < self.PAGE_SIZE or not cursors:
+            return
+
+        # At most max_concurrency requests are in flight or waiting to be consumed, so a slow
+        # consumer does not make every page of the window pile up in memory
+        cursors = iter(cursors)
+        window = deque()
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            try:
+                for cursor in islice(cursors, self.max_concurrency):
+                    window.append(executor.submit(self._fetch_page, start_date, end_date, cursor))
+                while window:
+                    data = window.popleft().result()
+                    for cursor in islice(cursors, 1):
+                        window.append(executor.submit(self._fetch_page, start_date, end_date, cursor))
+                    yield self._parse_page(data)
+            finally:
+                for future in window:
+                    future.cancel()
+
+    def _fetch_page(self, start_date: datetime, end_date: datetime, cursor: int) -> dict:
+        url = f"{self.base_url}{start_date.strftime('%Y-%m-%d')}/{end_date.strftime('%Y-%m-%d')}/{cursor}"
+        response = self.session.get(url)
+        response.raise_for_status()
+        return response.json()
+
+    def _parse_page(self, data: dict) -> List[Dict[str, Union[str, datetime]]]:
+        return [
+            {
+                'title': article['title'],
+                'abstract': article['abstract'],
+                'id': article['doi'],
+                'pdf_url': f"https://www.biorxiv.org/content/{article['doi']}v{article['version']}.full.pdf",
+                'updated': datetime.strptime(article['date'], '%Y-%m-%d')
+            }
+            for article in data.get('collection', [])
+        ]
 
 def main():
     # Example usage
@@ -0,0 +1,165 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Optional
+import requests
+
+
+class PdfCache:
+    """
+    A shared on-disk cache of downloaded PDF bytes.
+
+    Files are content addressed: they are named after the SHA-256 of their bytes, so the
+    same PDF served under several URLs is stored once. A small SQLite index maps each URL
+    to its file together with the ETag/Last-Modified validators the server sent, and the
+    time it was last used for LRU eviction once the cache grows past its size cap.
+
+    Entries younger than max_age are served without contacting the server; older ones are
+    revalidated with a conditional request, which costs a round trip but no download when
+    the PDF did not change. Files are written to a temporary name and renamed into place,
+    so concurrent readers and writers never see a partial PDF.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2 << 30, max_age: float = 24 * 3600):
+        """
+        Initialize the PdfCache.
+
+        Args:
+            cache_dir (str): The directory holding the cached PDFs and their index, created if needed.
+            max_bytes (int): The size above which least recently used PDFs are evicted. Defaults to 2 GiB.
+            max_age (float): Seconds during which a cached PDF is used without revalidation. Defaults to a day.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite'), timeout=30, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "url TEXT PRIMARY KEY, digest TEXT, size INTEGER, etag TEXT, last_modified TEXT, "
+            "validated REAL, last_used REAL)"
+        )
+        self.connection.commit()
+
+    def fetch(self, url: str, timeout: Optional[float] = None) -> bytes:
+        """
+        Get the bytes of a PDF, from the cache when possible.
+
+        Args:
+            url (str): The PDF URL.
+            timeout (Optional[float]): Seconds to wait for the server. Defaults to no limit.
+
+        Returns:
+            bytes: The PDF content.
+
+        Raises:
+            requests.HTTPError: The server answered with an error and nothing is cached.
+        """
+        with self._lock:
+            entry = self.connection.execute(
+                "SELECT digest, etag, last_modified, validated FROM entries WHERE url = ?", (url,)
+            ).fetchone()
+        content = self._read_file(entry[0]) if entry else None
+        if content is not None and time.time() - entry[3] < self.max_age:
+            self._touch(url)
+            return content
+
+        headers = {}
+        if content is not None:
+            if entry[1]:
+                headers['If-None-Match'] = entry[1]
+            if entry[2]:
+                headers['If-Modified-Since'] = entry[2]
+        try:
+            response = requests.get(url, headers=headers, timeout=timeout)
+        except requests.RequestException:
+            # A stale copy beats no copy when the server cannot be reached
+            if content is not None:
+                self._touch(url)
+                return content
+            raise
+
+        if response.status_code == 304 and content is not None:
+            self._touch(url, validated=True)
+            return content
+        response.raise_for_status()
+        self._store(url, response)
+        return response.content
+
+    def fresh_digest(self, url: str) -> Optional[str]:
+        """
+        The digest of a URL's cached PDF if fetch would serve it without contacting the server,
+        so what was derived from its content can be looked up without reading the file.
+        """
+        with self._lock:
+            entry = self.connection.execute("SELECT digest, validated FROM entries WHERE url = ?", (url,)).fetchone()
+        if entry is None or time.time() - entry[1] >= self.max_age or not os.path.exists(self._path(entry[0])):
+            return None
+        self._touch(url)
+        return entry[0]
+
+    def _store(self, url: str, response: requests.Response):
+        content = response.content
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            file_descriptor, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(file_descriptor, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+        now = time.time()
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, digest, len(content), response.headers.get('ETag'), response.headers.get('Last-Modified'), now, now)
+            )
+            self.connection.commit()
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            # One file may back several URLs, it is used as recently as the most recent of them
+            files = self.connection.execute(
+                "SELECT digest, MAX(size), MAX(last_used) AS used FROM entries GROUP BY digest ORDER BY used"
+            ).fetchall()
+            total_bytes = sum(size for _, size, _ in files)
+            evicted = []
+            for digest, size, _ in files:
+                if total_bytes <= self.max_bytes:
+                    break
+                evicted.append(digest)
+                total_bytes -= size
+            if not evicted:
+                return
+            self.connection.executemany("DELETE FROM entries WHERE digest = ?", ((digest,) for digest in evicted))
+            self.connection.commit()
+        for digest in evicted:
+            try:
+                os.remove(self._path(digest))
+            except FileNotFoundError:
+                pass
+
+    def _touch(self, url: str, validated: bool = False):
+        now = time.time()
+        with self._lock:
+            if validated:
+                self.connection.execute("UPDATE entries SET last_used = ?, validated = ? WHERE url = ?", (now, now, url))
+            else:
+                self.connection.execute("UPDATE entries SET last_used = ? WHERE url = ?", (now, url))
+            self.connection.commit()
+
+    def _read_file(self, digest: str) -> Optional[bytes]:
+        try:
+            with open(self._path(digest), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            # Evicted by another process since we looked it up
+            return None
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, digest + '.pdf')
@@ -1,100 +1,241 @@
 
 from abc import ABC, abstractmethod
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+import hashlib
+import mmap
+import multiprocessing
+import os
+import tempfile
+import time
 import requests
 import io
 import PyPDF2
 import pdfplumber
+from app.fetchers.pdf_cache import PdfCache
+from app.fetchers.text_cache import TextCache
+from app.fetchers.text_cleaner import CLEANER_VERSION, clean_text
 
 #create both strategies, pyPDF2 and pdfplumber for a pdf reader
 
 class PdfReaderStrategy(ABC):
-    @abstractmethod
-    def read(self,url:str):
-        pass
-
-class PyPDF2Reader(PdfReaderStrategy):
+    # Downloading is network bound and shared, extracting is CPU bound and strategy specific,
+    # so the two halves can run on different pools
     def read(self, url: str):
         response = requests.get(url)
-
         if response.status_code == 200:
-            pdf_content = io.BytesIO(response.content)
-            pdf_reader = PyPDF2.PdfReader(pdf_content)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()  # Extract text from each page
-            return self._clean_text(text)
+            return self.extract(response.content)
         else:
             return f"Failed to download PDF: {response.status_code}"
 
-    def _clean_text(self, text: str) -> str:
-        # Remove extra spaces while preserving paragraphs
-        text = '\n'.join(' '.join(line.split()) for line in text.split('\n'))
-        
-        # Remove references and everything that follows
-        import re
-        keywords = r'references|bibliography|works cited|literature cited'
-        text = re.split(f'(?i){keywords}', text)[0]
-        
-        # Remove references pattern [X], [X,Y], [X-Y]
-        text = re.sub(r'\[\d+(?:[-,]\d+)*\]', '', text)
-        
-        # Remove email addresses
-        text = re.sub(r'\S+@\S+', '', text)
-        
-        # Remove URLs
-        text = re.sub(r'http\S+', '', text)
-        
-        # Remove author names (assuming they are in Title Case)
-        text = re.sub(r'\b(?:[A-Z][a-z]+ ){2,}[A-Z][a-z]+\b', '', text)
-        
-        # Remove any remaining special characters except periods and commas
-        text = re.sub(r'[^\w\s.,]', '', text)
-        
-        return text.strip()
-class PdfPlumberReader(PdfReaderStrategy):
-    def read(self,url:str):
-        response = requests.get(url)
-        if response.status_code == 200:
-            pdf_content = io.BytesIO(response.content)
-            with pdfplumber.open(pdf_content) as pdf:
-                text = ""
-                for page in pdf.pages:
-                    text += page.extract_text()
-                return self._clean_text(text)
+    def download(self, url: str, timeout: Optional[float] = None) -> bytes:
+        response = requests.get(url, timeout=timeout)
+        response.raise_for_status()
+        return response.content
+
+    def extract(self, content: Union[bytes, str]) -> str:
+        # Page texts are joined once, building the text page by page copies it over and over
+        return clean_text(''.join(self.extract_pages(content)))
+
+    @abstractmethod
+    def page_count(self, source: Union[bytes, str]) -> int:
+        pass
+
+    @abstractmethod
+    def extract_pages(self, source: Union[bytes, str], start: int = 0, stop: Optional[int] = None) -> List[str]:
+        # The raw text of pages [start, stop) of a PDF given as bytes or as a file path
+        pass
+
+    @staticmethod
+    @contextmanager
+    def _open(source: Union[bytes, str]) -> Iterator[BinaryIO]:
+        # Bytes are wrapped without a copy, files are memory mapped instead of read
+        if isinstance(source, str):
+            with open(source, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
         else:
-            return f"Failed to download PDF: {response.status_code}"
-    
-    def _clean_text(self, text: str) -> str:
-        # Remove extra spaces while preserving paragraphs
-        text = '\n'.join(' '.join(line.split()) for line in text.split('\n'))
-        
-        # Remove references and everything that follows
-        import re
-        keywords = r'references|bibliography|works cited|literature cited'
-        text = re.split(f'(?i){keywords}', text)[0]
-        
-        # Remove references pattern [X], [X,Y], [X-Y]
-        text = re.sub(r'\[\d+(?:[-,]\d+)*\]', '', text)
-        
-        # Remove email addresses
-        text = re.sub(r'\S+@\S+', '', text)
-        
-        # Remove URLs
-        text = re.sub(r'http\S+', '', text)
-        
-        # Remove author names (assuming they are in Title Case)
-        text = re.sub(r'\b(?:[A-Z][a-z]+ ){2,}[A-Z][a-z]+\b', '', text)
-        
-        # Remove any remaining special characters except periods and commas
-        text = re.sub(r'[^\w\s.,]', '', text)
-        
-        return text.strip()
+            yield io.BytesIO(source)
+
+class PyPDF2Reader(PdfReaderStrategy):
+    def page_count(self, source: Union[bytes, str]) -> int:
+        with self._open(source) as stream:
+            return len(PyPDF2.PdfReader(stream).pages)
+
+    def extract_pages(self, source: Union[bytes, str], start: int = 0, stop: Optional[int] = None) -> List[str]:
+        with self._open(source) as stream:
+            pdf_reader = PyPDF2.PdfReader(stream)
+            # Extract text from each page
+            return [page.extract_text() or '' for page in pdf_reader.pages[start:stop]]
+
+class PdfPlumberReader(PdfReaderStrategy):
+    def page_count(self, source: Union[bytes, str]) -> int:
+        with self._open(source) as stream, pdfplumber.open(stream) as pdf:
+            return len(pdf.pages)
+
+    def extract_pages(self, source: Union[bytes, str], start: int = 0, stop: Optional[int] = None) -> List[str]:
+        with self._open(source) as stream, pdfplumber.open(stream) as pdf:
+            return [page.extract_text() or '' for page in pdf.pages[start:stop]]
+
+def extract_parallel(reader: PdfReaderStrategy, source: Union[bytes, str], executor: Executor,
+                     pages_per_task: int = 8, timeout: Optional[float] = None) -> str:
+    """
+    Extract and clean the text of a PDF with its pages spread over an executor.
+
+    PDF bytes are written to a temporary file first, so the tasks only carry its path and
+    each worker memory maps the file instead of receiving a copy of the whole PDF. The
+    pages are counted by a task too, the calling thread never parses the PDF.
+
+    Args:
+        reader (PdfReaderStrategy): The strategy extracting the pages.
+        source (Union[bytes, str]): The PDF bytes, or the path of a PDF file, which workers memory map.
+        executor (Executor): Runs the page ranges, a process pool to use several cores.
+        pages_per_task (int): The number of pages extracted by each task. Defaults to 8.
+        timeout (Optional[float]): Seconds to wait for the whole PDF. Defaults to no limit.
+
+    Returns:
+        str: The cleaned text of the whole PDF.
+    """
+    if not isinstance(source, str):
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+            f.write(source)
+        try:
+            return extract_parallel(reader, f.name, executor, pages_per_task, timeout)
+        finally:
+            os.remove(f.name)
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    total_pages = executor.submit(reader.page_count, source).result(timeout=timeout)
+    time_left = None if deadline is None else max(0.0, deadline - time.monotonic())
+    if total_pages <= pages_per_task:
+        return executor.submit(reader.extract, source).result(timeout=time_left)
+    futures = [
+        executor.submit(reader.extract_pages, source, start, start + pages_per_task)
+        for start in range(0, total_pages, pages_per_task)
+    ]
+    done, not_done = wait(futures, timeout=time_left)
+    for future in not_done:
+        future.cancel()
+    if not_done:
+        raise TimeoutError(f"{len(not_done)} of {len(futures)} page ranges not extracted within {timeout}s")
+    return clean_text(''.join(page for future in futures for page in future.result()))
+
 class PdfReader:
-    def __init__(self,reader:PdfReaderStrategy = PyPDF2Reader()):
+    def __init__(self, reader: PdfReaderStrategy = PyPDF2Reader(), max_downloads: int = 8,
+                 max_processes: Optional[int] = None, download_timeout: float = 30.0,
+                 extract_timeout: float = 60.0, cache: Optional[PdfCache] = None,
+                 text_cache: Optional[TextCache] = None, pages_per_task: int = 8):
+        """
+        Initialize the PdfReader.
+
+        Args:
+            reader (PdfReaderStrategy): The strategy used to download and extract PDFs.
+            max_downloads (int): The number of PDFs downloaded at the same time by read_many. Defaults to 8.
+            max_processes (Optional[int]): The number of processes extracting text in read_many, 0 to extract
+                in the download threads instead. Defaults to the number of CPUs.
+            download_timeout (float): Seconds to wait for the server on each download. Defaults to 30.
+            extract_timeout (float): Seconds to wait for the extraction of each PDF. Defaults to 60.
+            cache (Optional[PdfCache]): Where downloaded PDFs are kept and looked up, whatever the strategy.
+                Defaults to downloading every time.
+            text_cache (Optional[TextCache]): Where cleaned texts are kept and looked up, so a PDF already
+                read by this strategy and cleaner is not extracted again. Defaults to extracting every time.
+            pages_per_task (int): Long PDFs are split in ranges of this many pages extracted in parallel. Defaults to 8.
+        """
         self.reader = reader
+        self.max_downloads = max_downloads
+        self.max_processes = max_processes
+        self.download_timeout = download_timeout
+        self.extract_timeout = extract_timeout
+        self.cache = cache
+        self.text_cache = text_cache
+        self.pages_per_task = pages_per_task
+        # Created here on the calling thread and kept, so repeated batches don't pay the process
+        # startup again. Workers are spawned rather than forked: read_many may run on a thread of
+        # a multithreaded process, and a fork copies locks held by the other threads.
+        self._downloads = ThreadPoolExecutor(max_workers=max_downloads)
+        self._extractions = None
+        if max_processes != 0:
+            self._extractions = ProcessPoolExecutor(max_workers=max_processes,
+                                                    mp_context=multiprocessing.get_context('spawn'))
 
     def read(self,url:str):
-        return self.reader.read(url)
+        if self.cache is None and self.text_cache is None:
+            return self.reader.read(url)
+        try:
+            return self._read_one(url, in_process=False)
+        except requests.HTTPError as e:
+            return f"Failed to download PDF: {e.response.status_code}"
+
+    def read_many(self, urls: List[str], timeout: Optional[float] = None) -> Tuple[Dict[str, str], Dict[str, Exception]]:
+        """
+        Download and extract several PDFs concurrently.
+
+        Downloads run on a thread pool and text extraction on a process pool, so the network
+        waits overlap and the parsing uses every core. PDFs that fail or are still not done
+        when the timeout expires are reported instead of holding up the others.
+
+        Args:
+            urls (List[str]): The PDF URLs to read.
+            timeout (Optional[float]): Seconds to wait for the whole batch. Defaults to no limit
+                beyond the per-PDF download and extraction timeouts.
+
+        Returns:
+            Tuple[Dict[str, str], Dict[str, Exception]]: The text of each PDF read, and the
+                error of each PDF that could not be read.
+        """
+        if self._downloads is None:
+            raise RuntimeError("read_many called on a closed PdfReader")
+        futures = {self._downloads.submit(self._read_one, url): url for url in dict.fromkeys(urls)}
+        done, not_done = wait(futures, timeout=timeout)
+
+        texts, failures = {}, {}
+        for future in done:
+            url = futures[future]
+            try:
+                texts[url] = future.result()
+            except Exception as e:
+                failures[url] = e
+        for future in not_done:
+            future.cancel()
+            failures[futures[future]] = TimeoutError(f"Not read within {timeout}s")
+        return texts, failures
+
+    def close(self):
+        if self._downloads is not None:
+            self._downloads.shutdown(wait=False, cancel_futures=True)
+            self._downloads = None
+        if self._extractions is not None:
+            self._extractions.shutdown(cancel_futures=True)
+            self._extractions = None
+
+    def _download(self, url: str) -> bytes:
+        if self.cache is not None:
+            return self.cache.fetch(url, timeout=self.download_timeout)
+        return self.reader.download(url, timeout=self.download_timeout)
+
+    def _read_one(self, url: str, in_process: bool = True) -> str:
+        if self.text_cache is None:
+            return self._extract(self._download(url), in_process)
+
+        reader_name = type(self.reader).__name__
+        # A fresh cached PDF is known by its digest, a cached text then avoids reading the PDF at all
+        digest = self.cache.fresh_digest(url) if self.cache is not None else None
+        text = self.text_cache.get(digest, reader_name, CLEANER_VERSION) if digest else None
+        if text is not None:
+            return text
+
+        content = self._download(url)
+        digest = hashlib.sha256(content).hexdigest()
+        text = self.text_cache.get(digest, reader_name, CLEANER_VERSION)
+        if text is None:
+            text = self._extract(content, in_process)
+            self.text_cache.put(digest, reader_name, CLEANER_VERSION, text)
+        return text
+
+    def _extract(self, content: bytes, in_process: bool) -> str:
+        if not in_process or self._extractions is None:
+            return self.reader.extract(content)
+        return extract_parallel(self.reader, content, self._extractions, self.pages_per_task, self.extract_timeout)
 
 def main():
     pdfreader = PyPDF2Reader()
@@ -0,0 +1,129 @@
+"""
+Check the shared PDF text cleaner against hand-written cases and the original cleaner.
+
+The cleaner must give the expected output on the golden cases, and the same output as
+the original per-strategy cleaner (kept below as legacy_clean_text) on randomly generated
+texts. Set LABMATE_PDF_CORPUS to a directory of PDFs to also compare them on the texts of
+those PDFs.
+
+Runs under pytest, or as a script that exits with an error when a check fails:
+    python -m app.fetchers.test_text_cleaner
+"""
+
+import glob
+import os
+import random
+import re
+import sys
+from typing import List
+from app.fetchers.text_cleaner import clean_text
+from app.fetchers.pdf_handling import PyPDF2Reader
+
+GOLDEN_CASES = [
+    ("", ""),
+    ("  Deep   learning\tof   aging  \n\n  multi-omics  ", "Deep learning of aging\n\nmultiomics"),
+    ("As shown in [1], [2,3] and [4-6], it works.", "As shown in ,  and , it works."),
+    ("Contact jane.doe@uni.edu or see https://x.org/a?b=c for code.", "Contact  or see  for code."),
+    ("Written by John Ronald Tolkien in 1937.", "Written by  in 1937."),
+    ("Results: 95% (n=10) & more; done!", "Results 95 n10  more done"),
+    ("Our method works.\nREFERENCES\n[1] A. Author, Some Title.", "Our method works."),
+    ("Intro text.\nWorks   Cited\nSmith 2001.", "Intro text."),
+    # The original cuts at 'references' inside words too, which is kept
+    ("User preferences matter.", "User p"),
+    # Removing a citation can join a token into an email or URL
+    ("a@[1] x[1]@y http[1]x ht[1]tpx", "a"),
+]
+
+ALPHABET = list("abcAB CXyz  \t\n.,;-@[]0123456789/:") + ["http", "References", "works  cited", "Ann Bob Cid ", "\xa0", "\r",
+                                                   "\u017f", "\u212a", "refe", "rences", "Works\tCited"]
+WORDS = ("the of aging cells deep learning model data multi-omics we show that expression (n=12) 95% "
+         "protein, signal. [3] [4-7] see http://doi.org/10.1/x mail@lab.org John Ronald Smith").split()
+
+
+def legacy_clean_text(text: str) -> str:
+    # The cleaner PyPDF2Reader and PdfPlumberReader used to carry, verbatim
+    # Remove extra spaces while preserving paragraphs
+    text = '\n'.join(' '.join(line.split()) for line in text.split('\n'))
+
+    # Remove references and everything that follows
+    keywords = r'references|bibliography|works cited|literature cited'
+    text = re.split(f'(?i){keywords}', text)[0]
+
+    # Remove references pattern [X], [X,Y], [X-Y]
+    text = re.sub(r'\[\d+(?:[-,]\d+)*\]', '', text)
+
+    # Remove email addresses
+    text = re.sub(r'\S+@\S+', '', text)
+
+    # Remove URLs
+    text = re.sub(r'http\S+', '', text)
+
+    # Remove author names (assuming they are in Title Case)
+    text = re.sub(r'\b(?:[A-Z][a-z]+ ){2,}[A-Z][a-z]+\b', '', text)
+
+    # Remove any remaining special characters except periods and commas
+    text = re.sub(r'[^\w\s.,]', '', text)
+
+    return text.strip()
+
+
+def random_texts(count: int, length: int) -> List[str]:
+    rng = random.Random(0)
+    return [''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, length))) for _ in range(count)]
+
+
+def paper_texts(count: int, words: int) -> List[str]:
+    # Body text with citations, links and names, then a bibliography a third as long
+    rng = random.Random(1)
+    texts = []
+    for _ in range(count):
+        body = ' '.join(rng.choice(WORDS) + ('\n' if rng.random() < 0.08 else '') for _ in range(words))
+        bibliography = ' '.join(rng.choice(WORDS) for _ in range(words // 3))
+        texts.append(f"{body}\nReferences\n{bibliography}")
+    return texts
+
+
+def corpus_texts(corpus: str) -> List[str]:
+    reader = PyPDF2Reader()
+    paths = sorted(glob.glob(os.path.join(corpus, '**', '*.pdf'), recursive=True))
+    return [''.join(reader.extract_pages(path)) for path in paths]
+
+
+def differences(texts: List[str]) -> List[str]:
+    return [text[:200] for text in texts if clean_text(text) != legacy_clean_text(text)]
+
+
+def test_golden_cases():
+    for text, expected in GOLDEN_CASES:
+        assert clean_text(text) == expected, f"{text!r} -> {clean_text(text)!r}, expected {expected!r}"
+        assert legacy_clean_text(text) == expected, f"the original cleaner gives {legacy_clean_text(text)!r} on {text!r}"
+
+
+def test_same_as_original_on_random_texts():
+    different = differences(random_texts(20_000, 200) + paper_texts(50, 2000))
+    assert not different, f"{len(different)} texts cleaned differently, first: {different[0]!r}"
+
+
+def test_same_as_original_on_corpus():
+    corpus = os.environ.get('LABMATE_PDF_CORPUS')
+    if not corpus:
+        return
+    different = differences(corpus_texts(corpus))
+    assert not different, f"{len(different)} PDFs cleaned differently, first: {different[0]!r}"
+
+
+def main():
+    failures = 0
+    for check in (test_golden_cases, test_same_as_original_on_random_texts, test_same_as_original_on_corpus):
+        try:
+            check()
+            print(f"{check.__name__}: ok")
+        except AssertionError as e:
+            print(f"{check.__name__}: FAILED {e}")
+            failures += 1
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
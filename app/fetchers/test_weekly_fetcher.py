@@ -0,0 +1,120 @@
+"""
+Check that streaming the weekly articles stops cleanly when writing fails, and that a run
+interrupted that way resumes without losing or repeating articles.
+
+The retrievers are fakes serving many small pages, so the fetchers fill the page queue
+and block on it while the writer fails.
+
+Runs under pytest, or as a script that exits with an error when a check fails:
+    python -m app.fetchers.test_weekly_fetcher
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Union
+from app.fetchers.fetchers import ArticleRetriever
+from app.fetchers.fetch_state import FetchState
+from app.fetchers.weekly_fetcher import WeeklyArticleFetcher
+
+PAGES = 30
+
+
+class FakeRetriever(ArticleRetriever):
+    BASE_URL = 'http://localhost/'
+    PAGE_SIZE = 2
+
+    def __init__(self, prefix: str):
+        super().__init__()
+        start = datetime.now() - timedelta(days=3)
+        self.articles = [
+            {'title': f"{prefix} {i}", 'abstract': "An abstract.", 'id': f"{prefix}-{i}", 'pdf_url': None,
+             'updated': start + timedelta(minutes=i)}
+            for i in range(PAGES * self.PAGE_SIZE)
+        ]
+
+    def iter_pages(self, start_date: datetime, end_date: datetime,
+                   start_cursor: int = 0) -> Iterator[List[Dict[str, Union[str, datetime]]]]:
+        for cursor in range(start_cursor, len(self.articles), self.PAGE_SIZE):
+            yield self.articles[cursor:cursor + self.PAGE_SIZE]
+
+
+class FailingFetchState(FetchState):
+    """
+    Fails to save the checkpoint of the given page, the way a full disk would.
+    """
+
+    def __init__(self, state_file: str, fail_on_page: int):
+        super().__init__(state_file)
+        self.fail_on_page = fail_on_page
+        self.pages = 0
+
+    def page_done(self, *args, **kwargs):
+        self.pages += 1
+        if self.pages == self.fail_on_page:
+            raise OSError("No space left on device")
+        super().page_done(*args, **kwargs)
+
+
+def stream(fetcher: WeeklyArticleFetcher, filename: str, timeout: float = 10.0):
+    # Runs on a thread so a hang fails the check instead of the whole run
+    outcome = {}
+
+    def run():
+        try:
+            outcome['written'] = fetcher.stream_last_week_articles_to_jsonl(filename)
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), f"stream_last_week_articles_to_jsonl still running after {timeout}s"
+    return outcome
+
+
+def test_writer_failure_raises():
+    with tempfile.TemporaryDirectory() as directory:
+        fetch_state = FailingFetchState(os.path.join(directory, 'state.json'), fail_on_page=1)
+        fetcher = WeeklyArticleFetcher(FakeRetriever('arxiv'), FakeRetriever('biorxiv'), fetch_state)
+        outcome = stream(fetcher, os.path.join(directory, 'articles.jsonl'))
+        assert isinstance(outcome.get('error'), OSError), f"expected the OSError, got {outcome}"
+
+
+def test_resume_after_failure():
+    with tempfile.TemporaryDirectory() as directory:
+        state_file = os.path.join(directory, 'state.json')
+        arxiv, biorxiv = FakeRetriever('arxiv'), FakeRetriever('biorxiv')
+        outcome = stream(WeeklyArticleFetcher(arxiv, biorxiv, FailingFetchState(state_file, fail_on_page=5)),
+                         os.path.join(directory, 'articles.jsonl'))
+        assert isinstance(outcome.get('error'), OSError), f"expected the OSError, got {outcome}"
+
+        # Resumed under another name, as on the next day: the interrupted run's file is kept
+        outcome = stream(WeeklyArticleFetcher(arxiv, biorxiv, FetchState(state_file)),
+                         os.path.join(directory, 'articles_next_day.jsonl'))
+        assert 'error' not in outcome, f"the resumed run failed: {outcome}"
+        assert not os.path.exists(os.path.join(directory, 'articles_next_day.jsonl'))
+        with open(os.path.join(directory, 'articles.jsonl'), encoding='utf-8') as f:
+            ids = [json.loads(line)['id'] for line in f]
+        expected = [article['id'] for article in arxiv.articles + biorxiv.articles]
+        assert sorted(ids) == sorted(expected), f"{len(ids)} articles written, expected each of {len(expected)} once"
+
+
+def main():
+    failures = 0
+    for check in (test_writer_failure_raises, test_resume_after_failure):
+        try:
+            check()
+            print(f"{check.__name__}: ok")
+        except AssertionError as e:
+            print(f"{check.__name__}: FAILED {e}")
+            failures += 1
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class TextCache:
+    """
+    A persistent cache of the cleaned text extracted from PDFs.
+
+    Entries are keyed by (SHA-256 of the PDF bytes, reader strategy, cleaner version):
+    the same PDF read by another strategy, or cleaned by a newer cleaner, is a miss.
+    Storing a text replaces the entries of the same PDF and strategy made by other
+    cleaner versions, so stale texts disappear as papers are read again, and the least
+    recently used entries are evicted past max_entries.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100_000):
+        """
+        Initialize the TextCache.
+
+        Args:
+            path (str): The file path of the SQLite database, created if it does not exist.
+            max_entries (int): The number of texts kept. Defaults to 100000.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS texts ("
+            "digest TEXT, reader TEXT, cleaner_version INTEGER, text TEXT, last_used REAL, "
+            "PRIMARY KEY (digest, reader, cleaner_version))"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS texts_last_used ON texts (last_used)")
+        self.connection.commit()
+
+    def get(self, digest: str, reader: str, cleaner_version: int) -> Optional[str]:
+        """
+        Look up the text of a PDF.
+
+        Args:
+            digest (str): The SHA-256 hex digest of the PDF bytes.
+            reader (str): The name of the reader strategy.
+            cleaner_version (int): The version of the text cleaner.
+
+        Returns:
+            Optional[str]: The cached text, or None if it is not cached.
+        """
+        key = (digest, reader, cleaner_version)
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT text FROM texts WHERE digest = ? AND reader = ? AND cleaner_version = ?", key
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE texts SET last_used = ? WHERE digest = ? AND reader = ? AND cleaner_version = ?", (time.time(), *key)
+            )
+            self.connection.commit()
+        return row[0]
+
+    def put(self, digest: str, reader: str, cleaner_version: int, text: str):
+        """
+        Store the text of a PDF, replacing what older cleaner versions stored for it.
+        """
+        with self._lock:
+            self.connection.execute("DELETE FROM texts WHERE digest = ? AND reader = ?", (digest, reader))
+            self.connection.execute(
+                "INSERT INTO texts VALUES (?, ?, ?, ?, ?)", (digest, reader, cleaner_version, text, time.time())
+            )
+            excess = self.connection.execute("SELECT COUNT(*) FROM texts").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self.connection.execute(
+                    "DELETE FROM texts WHERE rowid IN (SELECT rowid FROM texts ORDER BY last_used LIMIT ?)", (excess,)
+                )
+            self.connection.commit()
@@ -0,0 +1,61 @@
+"""
+The text cleaner shared by every PDF reader strategy.
+
+The patterns are compiled once at import. The text is cut at the first references
+heading before anything else, so the bibliography (often a third of a paper) is
+never normalized or scanned, and the remaining steps run as three regex passes
+instead of six:
+    - bracketed citations such as [1], [2,3] or [4-6]
+    - email addresses and URLs, both of which remove whole whitespace-free tokens
+    - author-like runs of Title Case words and special characters other than periods and commas
+Each pass is skipped when the text cannot contain a match.
+
+The output is the same as the original per-strategy cleaner, which
+app/fetchers/test_text_cleaner.py checks. Bump CLEANER_VERSION whenever it changes.
+"""
+
+import re
+
+# Part of the key of cached texts, see TextCache
+CLEANER_VERSION = 1
+
+# Matches the same places as the headings searched in whitespace-normalized text, where a run
+# of spaces inside a line is a single space. Starting with a plain character set lets the regex
+# engine skip ahead to candidate letters, a case-insensitive alternation is tried at every position.
+_REFERENCES = re.compile(
+    r'[RrBbWwLl](?i:(?<=r)eferences|(?<=b)ibliography|(?<=w)orks[^\S\n]+cited|(?<=l)iterature[^\S\n]+cited)'
+)
+_CITATIONS = re.compile(r'\[\d+(?:[-,]\d+)*\]')
+# Citations must go first: removing one can join a token into an email or URL
+_EMAILS_AND_URLS = re.compile(r'\S+@\S+|http\S+')
+# Authors are three or more Title Case words; neither alternative can match inside the other.
+# Same as \b(?:[A-Z][a-z]+ ){2,}[A-Z][a-z]+\b, but starting with a character set for the same reason.
+_AUTHORS_AND_SPECIAL_CHARACTERS = re.compile(r'[A-Z](?<=\b[A-Z])[a-z]+ (?:[A-Z][a-z]+ )+[A-Z][a-z]+\b|[^\w\s.,]+')
+
+
+def clean_text(text: str) -> str:
+    """
+    Clean the raw text extracted from a PDF.
+
+    Args:
+        text (str): The raw text.
+
+    Returns:
+        str: The text before the references, with spaces collapsed inside each line and
+            citations, emails, URLs, author names and special characters removed.
+    """
+    # Remove references and everything that follows
+    match = _REFERENCES.search(text)
+    if match:
+        text = text[:match.start()]
+
+    # Remove extra spaces while preserving paragraphs
+    text = '\n'.join(' '.join(line.split()) for line in text.split('\n'))
+
+    if '[' in text:
+        text = _CITATIONS.sub('', text)
+    if '@' in text or 'http' in text:
+        text = _EMAILS_AND_URLS.sub('', text)
+    text = _AUTHORS_AND_SPECIAL_CHARACTERS.sub('', text)
+
+    return text.strip()
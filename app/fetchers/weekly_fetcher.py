@@ -1,12 +1,23 @@
+import gzip
 import json
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Union
-from app.fetchers.fetchers import ArXivRetriever, BioRxivRetriever
+from typing import List, Dict, Union, Optional
+from app.fetchers.fetchers import ArticleRetriever, ArXivRetriever, BioRxivRetriever
+from app.fetchers.fetch_state import FetchState
 
 class WeeklyArticleFetcher:
-    def __init__(self):
-        self.arxiv_retriever = ArXivRetriever()
-        self.biorxiv_retriever = BioRxivRetriever()
+    def __init__(self, arxiv_retriever: Optional[ArXivRetriever] = None,
+                 biorxiv_retriever: Optional[BioRxivRetriever] = None,
+                 fetch_state: Optional[FetchState] = None):
+        self.arxiv_retriever = arxiv_retriever or ArXivRetriever()
+        self.biorxiv_retriever = biorxiv_retriever or BioRxivRetriever()
+        # With a fetch state, streaming only fetches what is new since the last run
+        # and resumes an interrupted run where it stopped
+        self.fetch_state = fetch_state
 
     def fetch_last_week_articles(self) -> Dict[str, List[Dict[str, Union[str, datetime]]]]:
         end_date = datetime.now()
@@ -14,35 +25,145 @@ class WeeklyArticleFetcher:
 
         print(f"Fetching articles from {start_date} to {end_date}")
 
-        arxiv_articles = self.arxiv_retriever.fetch_articles(start_date, end_date)
-        biorxiv_articles = self.biorxiv_retriever.fetch_articles(start_date, end_date)
+        # Both sources are fetched at the same time, so the wall time is that of the slowest one
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            arxiv_future = executor.submit(self.arxiv_retriever.fetch_articles, start_date, end_date)
+            biorxiv_future = executor.submit(self.biorxiv_retriever.fetch_articles, start_date, end_date)
 
-        return {
-            "arxiv": arxiv_articles,
-            "biorxiv": biorxiv_articles
-        }
+            return {
+                "arxiv": arxiv_future.result(),
+                "biorxiv": biorxiv_future.result()
+            }
 
     def save_articles_to_json(self, articles: Dict[str, List[Dict[str, Union[str, datetime]]]], filename: str):
         # Convert datetime objects to ISO format strings for JSON serialization
-        for source, article_list in articles.items():
-            for article in article_list:
-                article['updated'] = article['updated'].isoformat()
-
         with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(articles, f, ensure_ascii=False, indent=2)
+            json.dump(articles, f, ensure_ascii=False, indent=2, default=lambda value: value.isoformat())
+
+    def stream_last_week_articles_to_jsonl(self, filename: str, compress: bool = False) -> int:
+        """
+        Fetch last week's articles from both sources at once and write each of them as
+        one JSON line with its 'source', page by page as the pages arrive.
+
+        Only a few pages are held in memory at any time, and every page is flushed so
+        downstream readers can start before the fetch is over.
+
+        With a fetch state, each source starts at its watermark instead of a week ago,
+        articles already written by a previous run are skipped, and a checkpoint is saved
+        after every written page. The file is then appended to, so a resumed run keeps
+        what the interrupted one wrote. A resumed run writes to the file of the interrupted
+        one, cut back to its size at the last checkpoint so no page is written twice.
+
+        Compressed files are written one gzip member per page, which gzip readers read
+        as a single stream, so every checkpoint falls on a member boundary.
+
+        Args:
+            filename (str): The JSONL file to write, unless a run to resume was writing another one.
+            compress (bool): Write it gzip compressed. Defaults to False.
+
+        Returns:
+            int: The number of articles written.
+        """
+        end_date = datetime.now()
+        default_start = end_date - timedelta(days=7)
+
+        retrievers = {"arxiv": self.arxiv_retriever, "biorxiv": self.biorxiv_retriever}
+        windows = {}
+        for source in retrievers:
+            if self.fetch_state is None:
+                windows[source] = (default_start, end_date, 0)
+            else:
+                windows[source] = self.fetch_state.begin(source, default_start, end_date)
+            print(f"Fetching {source} articles from {windows[source][0]} to {windows[source][1]}")
+
+        # Bounded, so a slow disk slows the fetchers down instead of piling pages up
+        pages = queue.Queue(maxsize=8)
+        # Set when the writer stops, so fetchers blocked on a full queue give up instead of hanging
+        stop = threading.Event()
+
+        def put(item: tuple) -> bool:
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce(source: str, retriever: ArticleRetriever):
+            start_date, end_date, cursor = windows[source]
+            try:
+                for page in retriever.iter_pages(start_date, end_date, cursor):
+                    cursor += retriever.PAGE_SIZE
+                    if not put((source, page, cursor)):
+                        return
+            except Exception as e:
+                put((source, e, None))
+            finally:
+                put((source, None, None))
+
+        mode = 'wb'
+        if self.fetch_state is not None:
+            filename, offset = self.fetch_state.output(filename)
+            mode = 'ab'
+            if os.path.exists(filename) and os.path.getsize(filename) > offset:
+                # Pages written after the last checkpoint are fetched again
+                os.truncate(filename, offset)
+
+        total_articles = 0
+        errors = {}
+        with ThreadPoolExecutor(max_workers=len(retrievers)) as executor, open(filename, mode) as f:
+            for source, retriever in retrievers.items():
+                executor.submit(produce, source, retriever)
+
+            try:
+                finished = 0
+                while finished < len(retrievers):
+                    source, page, next_cursor = pages.get()
+                    if page is None:
+                        finished += 1
+                        if self.fetch_state is not None and source not in errors:
+                            self.fetch_state.finish(source)
+                    elif isinstance(page, Exception):
+                        errors[source] = page
+                    else:
+                        if self.fetch_state is not None:
+                            page = [article for article in page if self.fetch_state.is_new(source, article)]
+                        data = ''.join(
+                            json.dumps({"source": source, **article, "updated": article['updated'].isoformat()},
+                                       ensure_ascii=False) + "\n"
+                            for article in page
+                        ).encode('utf-8')
+                        if data:
+                            f.write(gzip.compress(data) if compress else data)
+                            f.flush()
+                        total_articles += len(page)
+                        # Only checkpoint once the page is safely written
+                        if self.fetch_state is not None:
+                            self.fetch_state.page_done(source, next_cursor, page, f.tell())
+            finally:
+                # Fetchers blocked on the full queue give up, so leaving the executor does not hang
+                stop.set()
+
+        if errors:
+            raise next(iter(errors.values()))
+        return total_articles
+
+    def fetch_and_save_weekly_articles(self, compress: bool = False):
+        # Re-running on the same day appends to that day's file when using a fetch state
+        filename = f"database/weekly_articles_{datetime.now().strftime('%Y%m%d')}.jsonl"
+        if compress:
+            filename += ".gz"
+        if self.fetch_state is not None:
+            # An interrupted run is resumed in the file it started, whatever day it was
+            filename, _ = self.fetch_state.output(filename)
+        total_articles = self.stream_last_week_articles_to_jsonl(filename, compress)
 
-    def fetch_and_save_weekly_articles(self):
-        articles = self.fetch_last_week_articles()
-        
-        total_articles = sum(len(article_list) for article_list in articles.values())
         print(f"\nFetched a total of {total_articles} articles")
-        
-        filename = f"database/weekly_articles_{datetime.now().strftime('%Y%m%d')}.json"
-        self.save_articles_to_json(articles, filename)
         print(f"Articles saved to {filename}")
 
 def main():
-    fetcher = WeeklyArticleFetcher()
+    fetcher = WeeklyArticleFetcher(fetch_state=FetchState("database/fetch_state.json"))
     fetcher.fetch_and_save_weekly_articles()
 
 if __name__ == "__main__":
@@ -1,9 +1,9 @@
 from app.composers.analizer import PaperAnalyzerFactory
-from app.fetchers.pdf_handling import PdfReader
 from app.composers.thinkers import (
     TechnicalComposer, PhilosopherComposer, FirstPrinciplesComposer,
     HistoryOfScienceComposer, MailComposer
 )
+from app.composers.orchestration import ComposerGraph, Output
 
 import os
 from dotenv import load_dotenv
@@ -19,12 +19,41 @@ def main():
         'llm_provider': 'gemini',
         'llm_config': {
             'model': 'gemini-1.5-flash',
-            'temperature': 0.0
+            'temperature': 0.0,
+            # Quota shared by every Gemini call of the process, the analyzer's and the composers'.
+            # These are the free tier's, raise them on a paid plan.
+            'requests_per_minute': 15,
+            'tokens_per_minute': 1_000_000
         },
         'api_key': os.getenv('API_KEY'),
         'bert_model_name': 'BAAI/bge-base-en-v1.5',
-        'index_file': 'bge_vector_database_faiss_index_20241015.bin',
-        'metadata_file': 'bge_vector_database_metadata_20241015.pkl',
+        # Rolling index maintained by database_management/vector_database/main.py
+        'index_file': 'bge_vector_database_faiss_index.bin',
+        'metadata_file': 'bge_vector_database_metadata.sqlite',
+        # 'flat' is exact search; 'ivf_flat', 'ivf_pq' and 'hnsw' trade recall for speed,
+        # see database_management/vector_database/benchmark.py to pick the knobs
+        'index_type': 'flat',
+        'index_params': {},
+        'search_params': {},
+        # Map the index read-only instead of loading it, cheap for short-lived digest runs
+        'mmap_index': True,
+        # 'abstract' selects papers from the abstracts stored in the index and only reads the chosen
+        # paper's PDF, 'pdf' reads the PDF of every hit to select them
+        'selection_mode': 'abstract',
+        # Tokens the selection prompt may use, shared between the hits by closeness to the interests
+        'prompt_token_budget': 32_000,
+        # Seconds each composer's LLM call may take
+        'composer_timeout': 180,
+        # Temperature 0 LLM responses are kept here, so re-runs don't pay for the same prompts again
+        'llm_cache_file': 'llm_response_cache.sqlite',
+        # PDFs of the hits are downloaded and parsed concurrently; slower ones are skipped
+        'pdf_max_downloads': 8,
+        'pdf_read_timeout': 120,
+        # Downloaded PDFs are kept here, shared by every run, and evicted least recently used first
+        'pdf_cache_dir': 'pdf_cache',
+        'pdf_cache_max_bytes': 2 << 30,
+        # Cleaned text of the PDFs already read, so they are not parsed again
+        'text_cache_file': 'pdf_text_cache.sqlite',
         'top_k': 20 
     }
 
@@ -51,31 +80,40 @@ def main():
         selected_paper = chosen_papers[0]
         pdf_url = selected_paper['pdf_url']
         
-        # Create a PdfReader instance and read the PDF
-        pdf_reader = PdfReader()
+        # Read the PDF with the analyzer's reader, so it comes from its cache
+        pdf_reader = analyzer.pdf_reader
         print(f"Reading the PDF file: {pdf_url}")
         pdf_content = pdf_reader.read(pdf_url)
         print(f"PDF file read: {pdf_content[:100]} (...)")
 
         # Initialize composers with specific LLM providers and settings
-        technical_composer = TechnicalComposer("gemini", temperature=0.0)
-        philosopher_composer = PhilosopherComposer("gemini", temperature=1.0)
-        first_principles_composer = FirstPrinciplesComposer("gemini", temperature=1.0)
-        #history_of_science_composer = HistoryOfScienceComposer("gemini", temperature=1.0)
-        mail_composer = MailComposer("gemini", temperature=0.5)
+        # The technical analysis is deterministic, so it shares the analyzer's response cache
+        response_cache = analyzer.llm_provider.response_cache
+        # The composers draw from the analyzer's quota, so they must be given the same budgets
+        rate_limits = {key: config['llm_config'][key] for key in ('requests_per_minute', 'tokens_per_minute')}
+        technical_composer = TechnicalComposer("gemini", temperature=0.0, response_cache=response_cache, **rate_limits)
+        philosopher_composer = PhilosopherComposer("gemini", temperature=1.0, **rate_limits)
+        first_principles_composer = FirstPrinciplesComposer("gemini", temperature=1.0, **rate_limits)
+        #history_of_science_composer = HistoryOfScienceComposer("gemini", temperature=1.0, **rate_limits)
+        mail_composer = MailComposer("gemini", temperature=0.5, **rate_limits)
 
-        # Perform analyses
-        technical_analysis = technical_composer.compose(pdf_content, user_interests)
-        philosopher_analysis = philosopher_composer.compose(pdf_content, user_interests)
-        first_principles_analysis = first_principles_composer.compose(pdf_content, user_interests)
-        #history_of_science_analysis = history_of_science_composer.compose(pdf_content, user_interests)
-
-        # Generate final mail
-        mail = mail_composer.compose(
-            pdf_content, technical_analysis, philosopher_analysis,
-            first_principles_analysis,"",
-            user_interests
-        )
+        # Perform the analyses concurrently, then the mail as soon as they are in.
+        # A failed or slow analysis is left empty rather than holding up the mail.
+        graph = ComposerGraph(timeout=config['composer_timeout'])
+        graph.add('technical', technical_composer, pdf_content, user_interests, fallback="")
+        graph.add('philosopher', philosopher_composer, pdf_content, user_interests, fallback="")
+        graph.add('first_principles', first_principles_composer, pdf_content, user_interests, fallback="")
+        #graph.add('history_of_science', history_of_science_composer, pdf_content, user_interests, fallback="")
+        graph.add('mail', mail_composer,
+                  pdf_content, Output('technical'), Output('philosopher'),
+                  Output('first_principles'), "",
+                  user_interests)
+        outputs, errors = graph.run()
+        technical_analysis = outputs['technical']
+        philosopher_analysis = outputs['philosopher']
+        first_principles_analysis = outputs['first_principles']
+        #history_of_science_analysis = outputs['history_of_science']
+        mail = outputs.get('mail', f"Could not compose the mail: {errors.get('mail')}")
 
         # Print results
         print("\n--- Analysis Results ---")